@@ -0,0 +1,7 @@
+"""Добавление корня репозитория в sys.path для запуска скриптов из benchmarks/."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,186 @@
+"""
+Бенчмарк путей сбора данных на эмулируемых SSH-серверах.
+
+Измеряет пропускную способность и перцентили задержки:
+  * get_system_info_ssh - сбор данных для /log;
+  * SystemMonitor._get_metrics - сбор метрик мониторинга;
+  * полный цикл мониторинга - одна плановая проверка каждого хоста
+    через общий планировщик.
+
+Пример:
+    python benchmarks/bench_collection.py --hosts 50 --latency 0.03 --jitter 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import _path  # noqa: F401
+
+# Хранилища бота переносятся во временный каталог до импорта модулей
+_TMP = tempfile.mkdtemp(prefix="ssb-bench-")
+os.environ.setdefault("BOT_TOKEN", "123456:bench-token")
+os.environ.setdefault("METRICS_STORAGE_PATH", os.path.join(_TMP, "metrics"))
+os.environ.setdefault("REPORT_STORAGE_PATH", os.path.join(_TMP, "reports"))
+os.environ.setdefault("STATE_DB_PATH", os.path.join(_TMP, "state.db"))
+os.environ.setdefault("LOGS_PATH", os.path.join(_TMP, "logs"))
+
+from fake_ssh import start_servers  # noqa: E402
+from stats import print_table, summarize  # noqa: E402
+
+async def measure(name: str, calls: List[Callable[[], Awaitable[bool]]],
+                  concurrency: int) -> Dict[str, float]:
+    """Выполнение вызовов с ограничением параллельности; вызов возвращает признак успеха."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def run(call):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await call()
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(call) for call in calls))
+    return summarize(name, latencies, errors, time.perf_counter() - started)
+
+class _NullBot:
+    """Заглушка бота для SystemMonitor: уведомления только считаются."""
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, *args, **kwargs):
+        self.sent += 1
+
+async def bench_system_info(main, servers, rounds: int, concurrency: int) -> Dict[str, float]:
+    async def call(ssh_data):
+        data = await main.get_system_info_ssh(
+            ssh_data['hostname'], ssh_data['port'], ssh_data['username'], ssh_data['password']
+        )
+        return bool(data) and 'Пользователь' in data
+
+    calls = [lambda d=server.ssh_data: call(d) for _ in range(rounds) for server in servers]
+    return await measure('get_system_info_ssh', calls, concurrency)
+
+async def bench_get_metrics(monitor, servers, rounds: int, concurrency: int) -> Dict[str, float]:
+    async def call(ssh_data):
+        metrics = await monitor._get_metrics(monitor._host_key(ssh_data), ssh_data)
+        return bool(metrics)
+
+    calls = [lambda d=server.ssh_data: call(d) for _ in range(rounds) for server in servers]
+    return await measure('SystemMonitor._get_metrics', calls, concurrency)
+
+async def bench_monitor_cycle(monitor, servers, rounds: int) -> Dict[str, float]:
+    """Каждый раунд - одна плановая проверка всех хостов через планировщик."""
+    latencies: List[float] = []
+    errors = 0
+    wall = 0.0
+    check = monitor._scheduled_check
+
+    for user_id, server in enumerate(servers, start=1):
+        monitor._subscribe(user_id, monitor._host_key(server.ssh_data), server.ssh_data)
+
+    for _ in range(rounds):
+        done = asyncio.get_running_loop().create_future()
+        remaining = len(servers)
+
+        async def timed_check(host_key):
+            nonlocal remaining, errors
+            ring = monitor.history.get(host_key)
+            before = len(ring) if ring is not None else 0
+            started = time.perf_counter()
+            interval = await check(host_key)
+            ring = monitor.history.get(host_key)
+            # Успешная проверка добавляет замер в историю хоста
+            if ring is not None and len(ring) > before:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+            remaining -= 1
+            if remaining == 0 and not done.done():
+                done.set_result(None)
+            return interval
+
+        monitor.scheduler.check = timed_check
+        started = time.perf_counter()
+        for server in servers:
+            monitor.scheduler.add(monitor._host_key(server.ssh_data), 0, spread=False)
+        await done
+        wall += time.perf_counter() - started
+        for server in servers:
+            monitor.scheduler.remove(monitor._host_key(server.ssh_data))
+
+    monitor.scheduler.check = check
+    return summarize('monitoring cycle (per host)', latencies, errors, wall)
+
+async def run(args) -> List[Dict[str, float]]:
+    servers = start_servers(
+        args.hosts,
+        windows_ratio=args.windows_ratio,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        drop_rate=args.drop_rate
+    )
+    import main
+    from monitoring import SystemMonitor
+    from scheduler import MonitorScheduler
+
+    if not args.cache:
+        # Без кэша измеряется сам сбор, а не попадание в кэш
+        main.host_cache.live_ttl = 0
+    monitor = SystemMonitor(_NullBot())
+    monitor.scheduler = MonitorScheduler(monitor._scheduled_check, workers=args.workers, jitter=0)
+    if not args.cache:
+        monitor.metrics_cache.ttl = 0
+        monitor.metrics_cache.stale_ttl = 0
+
+    results = []
+    try:
+        # Первый проход: подключение, определение ОС и статичные сведения
+        results.append(await bench_system_info(main, servers, 1, args.concurrency))
+        results[-1]['name'] = 'get_system_info_ssh (cold)'
+        results.append(await bench_system_info(main, servers, args.rounds, args.concurrency))
+        results.append(await bench_get_metrics(monitor, servers, args.rounds, args.concurrency))
+        results.append(await bench_monitor_cycle(monitor, servers, args.rounds))
+    finally:
+        await monitor.shutdown()
+        await main.ssh_pool.close_all()
+        for server in servers:
+            server.close()
+    return results
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=20, help='число эмулируемых серверов')
+    parser.add_argument('--windows-ratio', type=float, default=0.0, help='доля Windows-хостов')
+    parser.add_argument('--latency', type=float, default=0.02, help='средняя задержка команды, с')
+    parser.add_argument('--jitter', type=float, default=0.005, help='разброс задержки, с')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='доля команд с ошибкой')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='доля команд с обрывом соединения')
+    parser.add_argument('--rounds', type=int, default=5, help='проходов по всем хостам')
+    parser.add_argument('--concurrency', type=int, default=32, help='одновременных вызовов')
+    parser.add_argument('--workers', type=int, default=16, help='обработчиков планировщика')
+    parser.add_argument('--cache', action='store_true', help='не отключать кэши метрик')
+    parser.add_argument('--json', action='store_true', help='вывод в формате JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,115 @@
+"""
+Бенчмарк задержки от обновления Telegram до ответа бота.
+
+Бот (main.py) запускается отдельным процессом и подключается к локальному
+эмулятору Bot API (fake_telegram.py). Обновления доставляются через long
+polling и через webhook; измеряется время от отправки обновления до
+вызова sendMessage ботом в тот же чат.
+
+Пример:
+    python benchmarks/bench_updates.py --updates 500 --chats 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import _path
+from fake_telegram import TOKEN, FakeTelegramServer
+from stats import print_table, summarize
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def start_bot(server: FakeTelegramServer, mode: str, tmp: str) -> asyncio.subprocess.Process:
+    env = dict(
+        os.environ,
+        BOT_TOKEN=TOKEN,
+        TELEGRAM_API_URL=server.base_url,
+        METRICS_STORAGE_PATH=os.path.join(tmp, "metrics"),
+        REPORT_STORAGE_PATH=os.path.join(tmp, "reports"),
+        STATE_DB_PATH=os.path.join(tmp, "state.db"),
+        LOGS_PATH=os.path.join(tmp, "logs")
+    )
+    env.pop('WEBHOOK_URL', None)
+    if mode == 'webhook':
+        port = free_port()
+        env.update(WEBHOOK_URL=f"http://127.0.0.1:{port}", WEBHOOK_HOST='127.0.0.1',
+                   WEBHOOK_PORT=str(port), WEBHOOK_SECRET='bench-secret')
+    return await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(_path.ROOT, 'main.py'), env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+
+async def stop_bot(process: asyncio.subprocess.Process):
+    if process.returncode is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(process.wait(), 15)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+async def bench_mode(mode: str, args) -> Dict[str, float]:
+    server = FakeTelegramServer()
+    await server.start()
+    tmp = tempfile.mkdtemp(prefix="ssb-bench-")
+    process = await start_bot(server, mode, tmp)
+    try:
+        # Прогрев: ответ на первое обновление означает, что бот принимает обновления
+        for chat_id in range(1, args.warmup + 1):
+            await server.send_update(chat_id, args.command, mode, timeout=60)
+
+        latencies: List[float] = []
+        errors = 0
+        per_chat = [args.updates // args.chats + (1 if i < args.updates % args.chats else 0)
+                    for i in range(args.chats)]
+
+        async def chat_session(chat_id: int, count: int):
+            # В одном чате следующее сообщение отправляется после ответа на предыдущее
+            nonlocal errors
+            for _ in range(count):
+                try:
+                    sent, replied = await server.send_update(chat_id, args.command, mode, timeout=args.timeout)
+                    latencies.append(replied - sent)
+                except (asyncio.TimeoutError, TimeoutError):
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(chat_session(1000 + idx, count) for idx, count in enumerate(per_chat)))
+        return summarize(f"{mode} {args.command}", latencies, errors, time.perf_counter() - started)
+    finally:
+        await stop_bot(process)
+        await server.close()
+
+async def run(args) -> List[Dict[str, float]]:
+    modes = ['polling', 'webhook'] if args.mode == 'both' else [args.mode]
+    return [await bench_mode(mode, args) for mode in modes]
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['polling', 'webhook', 'both'], default='both')
+    parser.add_argument('--updates', type=int, default=200, help='число обновлений')
+    parser.add_argument('--chats', type=int, default=20, help='число одновременно пишущих чатов')
+    parser.add_argument('--command', default='/start', help='текст обновления')
+    parser.add_argument('--warmup', type=int, default=3, help='обновлений для прогрева')
+    parser.add_argument('--timeout', type=float, default=10, help='ожидание ответа, с')
+    parser.add_argument('--json', action='store_true', help='вывод в формате JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+if __name__ == '__main__':
+    main_cli()
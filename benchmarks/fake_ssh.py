@@ -0,0 +1,235 @@
+"""
+Эмулятор SSH-серверов для бенчмарков.
+
+Каждый сервер слушает отдельный порт на 127.0.0.1 и отвечает на команды
+бота (пакетные скрипты Linux, отдельные команды, ``ver``, PowerShell)
+заранее подготовленными данными с настраиваемой задержкой, разбросом
+и долей отказов. Серверы работают в потоках paramiko внутри процесса
+бенчмарка.
+"""
+import json
+import random
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+import paramiko  # type: ignore
+
+import _path  # noqa: F401
+from collectors import (
+    BATCH_END, BATCH_MARKER, LINUX_REPORT_COMMANDS, LINUX_STAT_BASELINE_COMMAND,
+    WINDOWS_COMMAND, WINDOWS_METRICS_COMMAND
+)
+
+USERNAME = 'bench'
+PASSWORD = 'bench'
+
+# Один ключ на все серверы: генерация RSA заметно замедляет запуск
+_HOST_KEY: Optional[paramiko.RSAKey] = None
+
+def _host_key() -> paramiko.RSAKey:
+    global _HOST_KEY
+    if _HOST_KEY is None:
+        _HOST_KEY = paramiko.RSAKey.generate(2048)
+    return _HOST_KEY
+
+@dataclass
+class FakeHostConfig:
+    os_type: str = 'linux'
+    latency: float = 0.02  # средняя задержка ответа на команду, с
+    jitter: float = 0.005  # стандартное отклонение задержки, с
+    failure_rate: float = 0.0  # доля команд, завершающихся ошибкой без вывода
+    drop_rate: float = 0.0  # доля команд, на которых соединение обрывается
+    load: float = 30.0  # средняя загрузка CPU, %
+
+class FakeHost:
+    """Состояние эмулируемого хоста: счетчики /proc/stat, память и диск."""
+    CPU_HZ = 400  # тиков в секунду на всех ядрах
+
+    def __init__(self, config: FakeHostConfig):
+        self.config = config
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _stat_line(self) -> str:
+        elapsed = time.time() - self.started + 1000
+        load = max(0.0, min(100.0, random.gauss(self.config.load, 5))) / 100
+        total = int(elapsed * self.CPU_HZ)
+        busy = int(total * load)
+        idle = total - busy
+        return f"cpu  {busy} 0 0 {idle} 0 0 0 0 0 0"
+
+    def linux_output(self, key: str, baseline: bool = False) -> str:
+        if key == 'stat':
+            if baseline:
+                first = self._stat_line()
+                time.sleep(0.25)
+                return first + "\n" + self._stat_line()
+            return self._stat_line()
+        return {
+            'user': USERNAME,
+            'os_info': 'Ubuntu 22.04.4 LTS',
+            'kernel': '5.15.0-105-generic',
+            'cpu_info': 'Intel(R) Xeon(R) CPU E5-2680 v4 @ 2.40GHz',
+            'cpu_cores': '4',
+            'meminfo': ("MemTotal:        8048576 kB\nMemFree:         1048576 kB\n"
+                        "MemAvailable:    4048576 kB\nBuffers:          204800 kB\n"
+                        "Cached:          2048000 kB"),
+            'fs': '4096 26214400 13107200 12000000'
+        }.get(key, '')
+
+    def windows_output(self, full: bool) -> str:
+        data = {
+            'cpu_load': round(max(0.0, min(100.0, random.gauss(self.config.load, 5)))),
+            'ram_total_kb': 8388608,
+            'ram_free_kb': 4194304,
+            'disk_total': 256 * 1024 ** 3,
+            'disk_free': 100 * 1024 ** 3
+        }
+        if full:
+            data.update(user=USERNAME, os_name='Microsoft Windows Server 2022 Standard',
+                        os_version='10.0.20348', cpu_model='Intel(R) Xeon(R) Gold 6230',
+                        cpu_cores=8)
+        return json.dumps(data)
+
+    def execute(self, command: str):
+        """
+        Ответ на команду.
+
+        Returns:
+            Кортеж (stdout, stderr, код завершения)
+        """
+        if self.config.os_type == 'windows':
+            if command == 'ver':
+                return "\r\nMicrosoft Windows [Version 10.0.20348.2340]\r\n", "", 0
+            if command == WINDOWS_COMMAND:
+                return self.windows_output(full=True), "", 0
+            if command == WINDOWS_METRICS_COMMAND:
+                return self.windows_output(full=False), "", 0
+            return "", "'/bin/sh' is not recognized as an internal or external command\r\n", 1
+
+        if command == 'ver':
+            return "", "sh: 1: ver: not found\n", 127
+        if command.startswith('/bin/sh -c ') and BATCH_MARKER in command:
+            baseline = LINUX_STAT_BASELINE_COMMAND in command
+            parts = []
+            for key in re.findall(re.escape(BATCH_MARKER) + r"(\w+)", command):
+                if key == 'end':
+                    continue
+                parts.append(f"{BATCH_MARKER}{key}\n{self.linux_output(key, baseline)}")
+            parts.append(BATCH_END)
+            return "\n".join(parts) + "\n", "", 0
+        for key, cmd in LINUX_REPORT_COMMANDS.items():
+            if command == cmd:
+                return self.linux_output(key) + "\n", "", 0
+        if command == LINUX_STAT_BASELINE_COMMAND:
+            return self.linux_output('stat', baseline=True) + "\n", "", 0
+        if command == 'echo 1':
+            return "1\n", "", 0
+        return "", f"sh: 1: {command.split()[0]}: not found\n", 127
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, server: "FakeSSHServer", transport: paramiko.Transport):
+        self.server = server
+        self.transport = transport
+
+    def check_auth_password(self, username, password):
+        if username == USERNAME and password == PASSWORD:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(
+            target=self.server.handle_command,
+            args=(self.transport, channel, command.decode(errors='replace')),
+            daemon=True
+        ).start()
+        return True
+
+class FakeSSHServer:
+    """SSH-сервер на 127.0.0.1 со случайным портом."""
+    def __init__(self, config: FakeHostConfig):
+        self.config = config
+        self.host = FakeHost(config)
+        self.commands = 0
+        self.connections = 0
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(128)
+        self.port = self._sock.getsockname()[1]
+        self._transports: List[paramiko.Transport] = []
+        self._closed = False
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    @property
+    def ssh_data(self) -> dict:
+        return {'hostname': '127.0.0.1', 'port': self.port, 'username': USERNAME, 'password': PASSWORD}
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            transport = paramiko.Transport(client)
+            transport.add_server_key(_host_key())
+            self._transports.append(transport)
+            try:
+                transport.start_server(server=_ServerInterface(self, transport))
+            except (paramiko.SSHException, EOFError, OSError):
+                transport.close()
+
+    def _delay(self):
+        delay = random.gauss(self.config.latency, self.config.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def handle_command(self, transport: paramiko.Transport, channel: paramiko.Channel, command: str):
+        self.commands += 1
+        self._delay()
+        roll = random.random()
+        try:
+            if roll < self.config.drop_rate:
+                transport.close()
+                return
+            if roll < self.config.drop_rate + self.config.failure_rate:
+                channel.sendall_stderr(b"fake failure\n")
+                channel.send_exit_status(1)
+                return
+            stdout, stderr, status = self.host.execute(command)
+            if stdout:
+                channel.sendall(stdout.encode())
+            if stderr:
+                channel.sendall_stderr(stderr.encode())
+            channel.send_exit_status(status)
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+        finally:
+            channel.close()
+
+    def close(self):
+        self._closed = True
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
+
+def start_servers(count: int, windows_ratio: float = 0.0, **config) -> List[FakeSSHServer]:
+    """Запуск ``count`` серверов; доля Windows-хостов задается ``windows_ratio``."""
+    servers = []
+    windows = int(round(count * windows_ratio))
+    for idx in range(count):
+        os_type = 'windows' if idx < windows else 'linux'
+        servers.append(FakeSSHServer(FakeHostConfig(os_type=os_type, **config)))
+    return servers
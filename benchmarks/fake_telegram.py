@@ -0,0 +1,187 @@
+"""
+Эмулятор Telegram Bot API для бенчмарков без доступа к интернету.
+
+Сервер на aiohttp отвечает на методы, которые вызывает бот, и выдает
+обновления двумя способами: через getUpdates (long polling) или запросом
+на адрес, зарегистрированный setWebhook. Для каждого отправленного
+обновления можно дождаться ответа бота в тот же чат.
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+from aiohttp import ClientError, ClientSession, web  # type: ignore
+
+BOT_ID = 123456
+TOKEN = f"{BOT_ID}:bench-token"
+
+# Методы, после которых ответ бота в чат считается полученным
+REPLY_METHODS = {'sendMessage', 'sendDocument', 'editMessageText'}
+
+class FakeTelegramServer:
+    """Bot API на 127.0.0.1 со случайным портом."""
+    def __init__(self):
+        self.port = 0
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.calls: Dict[str, int] = {}
+        self._updates: List[dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Condition()
+        self._replies: Dict[int, List[asyncio.Future]] = {}
+        self._webhook_set = asyncio.Event()
+        self._deliveries: set = set()
+        self._runner: Optional[web.AppRunner] = None
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._session = ClientSession()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        params = dict(request.query)
+        if request.method == 'POST':
+            params.update(await request.post())
+        return params
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if request.match_info['token'] != TOKEN:
+            return web.json_response({'ok': False, 'error_code': 401, 'description': 'Unauthorized'}, status=401)
+        method = request.match_info['method']
+        params = await self._params(request)
+        self.calls[method] = self.calls.get(method, 0) + 1
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler is not None else True
+        if method in REPLY_METHODS:
+            self._resolve_reply(int(params.get('chat_id', 0)))
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _api_getMe(self, params: dict):
+        return {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+    async def _api_getUpdates(self, params: dict):
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        if offset < 0:
+            return self._updates[offset:]
+        # Обновления до offset подтверждены ботом
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        deadline = time.monotonic() + timeout
+        async with self._new_update:
+            while True:
+                pending = [u for u in self._updates if u['update_id'] >= offset]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    return pending
+                try:
+                    await asyncio.wait_for(self._new_update.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _api_setWebhook(self, params: dict):
+        self.webhook_url = params.get('url') or None
+        self.webhook_secret = params.get('secret_token') or None
+        if self.webhook_url:
+            self._webhook_set.set()
+        return True
+
+    async def _api_deleteWebhook(self, params: dict):
+        self.webhook_url = None
+        self._webhook_set.clear()
+        return True
+
+    async def _api_getWebhookInfo(self, params: dict):
+        return {'url': self.webhook_url or '', 'has_custom_certificate': False, 'pending_update_count': 0}
+
+    async def _message(self, params: dict):
+        chat_id = int(params.get('chat_id', 0))
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bench'},
+            'text': params.get('text', '')
+        }
+
+    _api_sendMessage = _message
+    _api_sendDocument = _message
+    _api_editMessageText = _message
+
+    def _resolve_reply(self, chat_id: int):
+        waiters = self._replies.get(chat_id)
+        if waiters:
+            future = waiters.pop(0)
+            if not future.done():
+                future.set_result(time.perf_counter())
+
+    def make_update(self, chat_id: int, text: str) -> dict:
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': f'user{chat_id}'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'},
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': next(self._update_ids), 'message': message}
+
+    async def _deliver_webhook(self, update: dict, timeout: float):
+        """Отправка обновления на webhook с повторами, пока бот не начнет принимать запросы."""
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret} if self.webhook_secret else {}
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                async with self._session.post(self.webhook_url, data=json.dumps(update),
+                                              headers={'Content-Type': 'application/json', **headers}) as resp:
+                    await resp.read()
+                    if resp.status == 200:
+                        return
+            except ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError("webhook недоступен")
+            await asyncio.sleep(0.05)
+
+    async def send_update(self, chat_id: int, text: str, mode: str,
+                          timeout: float = 30) -> Tuple[float, float]:
+        """
+        Отправка обновления боту и ожидание ответа в тот же чат.
+
+        Returns:
+            Кортеж (момент отправки, момент ответа) по time.perf_counter
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._replies.setdefault(chat_id, []).append(future)
+        update = self.make_update(chat_id, text)
+        sent = time.perf_counter()
+        if mode == 'webhook':
+            await asyncio.wait_for(self._webhook_set.wait(), timeout)
+            task = asyncio.ensure_future(self._deliver_webhook(update, timeout))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+        else:
+            async with self._new_update:
+                self._updates.append(update)
+                self._new_update.notify_all()
+        return sent, await asyncio.wait_for(future, timeout)
@@ -0,0 +1,31 @@
+"""Перцентили и вывод результатов бенчмарков."""
+from typing import Dict, List
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+def summarize(name: str, latencies: List[float], errors: int, wall: float) -> Dict[str, float]:
+    values = sorted(latencies)
+    total = len(values) + errors
+    return {
+        'name': name,
+        'calls': total,
+        'errors': errors,
+        'throughput': total / wall if wall > 0 else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p90_ms': percentile(values, 90) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': (values[-1] if values else 0.0) * 1000,
+        'wall_s': wall
+    }
+
+def print_table(results: List[Dict[str, float]]):
+    header = f"{'benchmark':<32}{'calls':>7}{'err':>5}{'ops/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['name']:<32}{r['calls']:>7}{r['errors']:>5}{r['throughput']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
@@ -0,0 +1,196 @@
+import os
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from reportlab.lib import colors  # type: ignore
+from reportlab.lib.units import inch  # type: ignore
+from reportlab.graphics.shapes import Drawing, String  # type: ignore
+from reportlab.graphics.charts.piecharts import Pie  # type: ignore
+from reportlab.graphics.charts.lineplots import LinePlot  # type: ignore
+from reportlab.graphics.charts.legends import Legend  # type: ignore
+
+# Движок графиков отчета: векторный reportlab (по умолчанию)
+# или растровый matplotlib, если он установлен
+CHART_BACKEND = os.getenv("REPORT_CHART_BACKEND", "reportlab").lower()
+
+CHART_WIDTH = 7 * inch
+PIE_HEIGHT = 2.3 * inch
+TREND_HEIGHT = 2.1 * inch
+
+PIE_COLORS = ['#FFB3BA', '#BAFFC9', '#BAE1FF']
+PIE_BG_COLORS = ['#FFE5E8', '#E8FFE5', '#E5F2FF']
+TREND_LABELS = {'cpu': 'Процессор', 'ram': 'ОЗУ', 'disk': 'Диск'}
+TREND_COLORS = {'cpu': '#E57373', 'ram': '#81C784', 'disk': '#64B5F6'}
+
+def resource_pies(resources: List[Tuple[str, float]], font_name: str, backend: Optional[str] = None):
+    """
+    Круговые диаграммы текущего использования ресурсов.
+
+    Args:
+        resources: Список пар (заголовок, процент)
+        font_name: Зарегистрированный шрифт с поддержкой кириллицы
+        backend: 'reportlab' или 'matplotlib'; по умолчанию CHART_BACKEND
+    """
+    if (backend or CHART_BACKEND) == 'matplotlib':
+        return _matplotlib_pies(resources)
+    return _reportlab_pies(resources, font_name)
+
+def trend_chart(title: str, now: float, series: Dict[str, tuple], unit: float, unit_name: str,
+                font_name: str, backend: Optional[str] = None):
+    """
+    Линейный график динамики нагрузки.
+
+    Args:
+        title: Заголовок графика
+        now: Момент построения; ось X откладывается назад от него
+        series: ``{ресурс: (timestamps, values)}``
+        unit: Длительность деления оси X в секундах
+        unit_name: Подпись оси X
+    """
+    if (backend or CHART_BACKEND) == 'matplotlib':
+        return _matplotlib_trend(title, now, series, unit, unit_name)
+    return _reportlab_trend(title, now, series, unit, unit_name, font_name)
+
+def _reportlab_pies(resources: List[Tuple[str, float]], font_name: str) -> Drawing:
+    drawing = Drawing(CHART_WIDTH, PIE_HEIGHT)
+    cell = CHART_WIDTH / len(resources)
+    size = PIE_HEIGHT - 50
+
+    for idx, (title, value) in enumerate(resources):
+        value = max(0.0, min(100.0, value))  # Нормализация значений
+        pie = Pie()
+        pie.x = idx * cell + (cell - size) / 2
+        pie.y = 20
+        pie.width = pie.height = size
+        # Минимальное значение, чтобы пустой сектор не ломал диаграмму
+        pie.data = [max(value, 0.01), max(100 - value, 0.01)]
+        pie.startAngle = 90
+        pie.direction = 'clockwise'
+        pie.slices.strokeColor = colors.white
+        pie.slices.strokeWidth = 1
+        pie.slices[0].fillColor = colors.HexColor(PIE_COLORS[idx % len(PIE_COLORS)])
+        pie.slices[1].fillColor = colors.HexColor(PIE_BG_COLORS[idx % len(PIE_BG_COLORS)])
+        drawing.add(pie)
+
+        center = idx * cell + cell / 2
+        drawing.add(String(center, PIE_HEIGHT - 18, title, fontName=font_name,
+                           fontSize=11, textAnchor='middle'))
+        drawing.add(String(center, 4, f"{value:.1f}%", fontName=font_name,
+                           fontSize=10, textAnchor='middle'))
+    return drawing
+
+def _reportlab_trend(title: str, now: float, series: Dict[str, tuple], unit: float,
+                     unit_name: str, font_name: str) -> Drawing:
+    drawing = Drawing(CHART_WIDTH, TREND_HEIGHT)
+    drawing.add(String(CHART_WIDTH / 2, TREND_HEIGHT - 12, title, fontName=font_name,
+                       fontSize=11, textAnchor='middle'))
+
+    plot = LinePlot()
+    plot.x = 35
+    plot.y = 30
+    plot.width = CHART_WIDTH - 130
+    plot.height = TREND_HEIGHT - 55
+
+    resources = list(series.keys())
+    data = []
+    x_min = 0.0
+    for resource in resources:
+        timestamps, values = series[resource]
+        xs = ((timestamps - now) / unit).tolist()
+        data.append(list(zip(xs, values.tolist())))
+        if xs:
+            x_min = min(x_min, xs[0])
+    plot.data = data
+
+    for idx, resource in enumerate(resources):
+        plot.lines[idx].strokeColor = colors.HexColor(TREND_COLORS[resource])
+        plot.lines[idx].strokeWidth = 1
+
+    plot.xValueAxis.valueMin = x_min
+    plot.xValueAxis.valueMax = 0
+    plot.xValueAxis.labels.fontName = font_name
+    plot.xValueAxis.labels.fontSize = 8
+    plot.xValueAxis.labelTextFormat = '%.0f'
+    plot.yValueAxis.valueMin = 0
+    plot.yValueAxis.valueMax = 100
+    plot.yValueAxis.valueStep = 25
+    plot.yValueAxis.labels.fontName = font_name
+    plot.yValueAxis.labels.fontSize = 8
+    plot.yValueAxis.visibleGrid = True
+    plot.yValueAxis.gridStrokeColor = colors.HexColor('#DDDDDD')
+    drawing.add(plot)
+
+    drawing.add(String(plot.x + plot.width / 2, 6, unit_name, fontName=font_name,
+                       fontSize=8, textAnchor='middle'))
+
+    legend = Legend()
+    legend.x = plot.x + plot.width + 15
+    legend.y = plot.y + plot.height
+    legend.fontName = font_name
+    legend.fontSize = 8
+    legend.alignment = 'right'
+    legend.colorNamePairs = [
+        (colors.HexColor(TREND_COLORS[resource]), TREND_LABELS[resource]) for resource in resources
+    ]
+    drawing.add(legend)
+    return drawing
+
+def _matplotlib_image(fig, height: float, dpi: int):
+    from reportlab.platypus import Image  # type: ignore
+
+    buf = BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', dpi=dpi)
+    buf.seek(0)
+    return Image(buf, width=CHART_WIDTH, height=height)
+
+def _matplotlib_pies(resources: List[Tuple[str, float]]):
+    import matplotlib  # type: ignore
+    matplotlib.use('Agg')  # Установка backend до импорта pyplot
+    from matplotlib.figure import Figure  # type: ignore
+
+    fig = Figure(figsize=(12, 4))
+    for idx, (title, value) in enumerate(resources):
+        value = max(0.0, min(100.0, value))  # Нормализация значений
+        ax = fig.add_subplot(131 + idx)
+        sizes = [value, 100 - value]
+
+        # Добавляем проверку на нулевые значения
+        if value == 0 and sizes[1] == 100:
+            sizes = [0.01, 99.99]  # Минимальное значение для отображения
+
+        _, _, autotexts = ax.pie(
+            sizes,
+            colors=[PIE_COLORS[idx], PIE_BG_COLORS[idx]],
+            startangle=90,
+            autopct='%1.1f%%',
+            pctdistance=0.85,
+            wedgeprops={'edgecolor': 'white', 'linewidth': 1}
+        )
+
+        # Настройка внешнего вида текста процентов
+        for autotext in autotexts:
+            autotext.set_color('black')
+            autotext.set_fontsize(9)
+
+        ax.set_title(title, pad=20)
+
+    fig.tight_layout(pad=3.0)
+    return _matplotlib_image(fig, PIE_HEIGHT, dpi=300)
+
+def _matplotlib_trend(title: str, now: float, series: Dict[str, tuple], unit: float, unit_name: str):
+    import matplotlib  # type: ignore
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure  # type: ignore
+
+    fig = Figure(figsize=(10, 3))
+    ax = fig.add_subplot(111)
+    for resource, (timestamps, values) in series.items():
+        ax.plot((timestamps - now) / unit, values, label=TREND_LABELS[resource],
+                color=TREND_COLORS[resource], linewidth=1)
+    ax.set_title(title)
+    ax.set_xlabel(unit_name)
+    ax.set_ylabel('%')
+    ax.set_ylim(0, 100)
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc='upper left', fontsize=8)
+    fig.tight_layout()
+    return _matplotlib_image(fig, TREND_HEIGHT, dpi=150)
@@ -0,0 +1,373 @@
+import base64
+import json
+import os
+import shlex
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Маркер секции в выводе пакетного скрипта
+BATCH_MARKER = "::ssb:"
+BATCH_END = BATCH_MARKER + "end"
+
+# Чтение счетчиков CPU: при отсутствии предыдущего замера для хоста
+# /proc/stat читается дважды с короткой паузой
+LINUX_STAT_COMMAND = "head -n 1 /proc/stat"
+LINUX_STAT_BASELINE_COMMAND = "head -n 1 /proc/stat; sleep 0.25; head -n 1 /proc/stat"
+
+# Метрики Linux из /proc и statvfs без запуска top/free/df
+LINUX_METRICS_COMMANDS = {
+    'stat': LINUX_STAT_COMMAND,
+    'meminfo': "grep -E '^(MemTotal|MemFree|MemAvailable|Buffers|Cached):' /proc/meminfo",
+    'fs': "stat -f -c '%S %b %f %a' /"
+}
+
+# Статичные сведения о Linux системе
+LINUX_FACTS_COMMANDS = {
+    'user': "whoami",
+    'os_info': "grep PRETTY_NAME /etc/os-release | cut -d= -f2 | tr -d '\"'",
+    'kernel': "uname -r",
+    'cpu_info': "grep 'model name' /proc/cpuinfo | head -n 1 | cut -d: -f2 | xargs",
+    'cpu_cores': "nproc"
+}
+
+# Команды сбора информации о Linux системе
+LINUX_REPORT_COMMANDS = {**LINUX_FACTS_COMMANDS, **LINUX_METRICS_COMMANDS}
+
+def _percent(used: float, total: float) -> float:
+    return round(used / total * 100, 1) if total > 0 else 0.0
+
+def build_batch_script(commands: Dict[str, str]) -> str:
+    """
+    Собирает набор команд в один скрипт для выполнения за один SSH-запрос.
+
+    Вывод каждой команды предваряется строкой-маркером ``::ssb:<ключ>``,
+    а в конце печатается ``::ssb:end``. Скрипт запускается через /bin/sh,
+    чтобы не зависеть от оболочки пользователя.
+    """
+    parts = []
+    for key, cmd in commands.items():
+        parts.append(f"echo '{BATCH_MARKER}{key}'; {{ {cmd}; }} 2>/dev/null")
+    parts.append(f"echo '{BATCH_END}'")
+    return "/bin/sh -c " + shlex.quote("\n".join(parts))
+
+def parse_batch_output(output: str, keys) -> Optional[Dict[str, str]]:
+    """
+    Разбирает вывод пакетного скрипта в словарь ``{ключ: вывод}``.
+
+    Returns:
+        None, если скрипт не отработал до конца (нет маркера завершения)
+    """
+    result: Dict[str, str] = {}
+    current = None
+    lines = []
+    finished = False
+
+    for line in output.splitlines():
+        line = line.rstrip('\r')
+        if line.startswith(BATCH_MARKER):
+            if current is not None:
+                result[current] = "\n".join(lines).strip()
+            if line == BATCH_END:
+                finished = True
+                break
+            current = line[len(BATCH_MARKER):]
+            lines = []
+        elif current is not None:
+            lines.append(line)
+
+    if not finished or any(key not in result for key in keys):
+        return None
+    return result
+
+def with_cpu_baseline(commands: Dict[str, str]) -> Dict[str, str]:
+    """Вариант набора команд с двойным чтением /proc/stat."""
+    return {**commands, 'stat': LINUX_STAT_BASELINE_COMMAND}
+
+LINUX_REPORT_SCRIPT = build_batch_script(LINUX_REPORT_COMMANDS)
+LINUX_REPORT_BASELINE_SCRIPT = build_batch_script(with_cpu_baseline(LINUX_REPORT_COMMANDS))
+LINUX_METRICS_SCRIPT = build_batch_script(LINUX_METRICS_COMMANDS)
+LINUX_METRICS_BASELINE_SCRIPT = build_batch_script(with_cpu_baseline(LINUX_METRICS_COMMANDS))
+
+def parse_proc_stat(line: str) -> Tuple[int, int]:
+    """
+    Разбор строки ``cpu`` из /proc/stat.
+
+    Returns:
+        Кортеж (всего тиков, тиков простоя)
+    """
+    fields = line.split()
+    if not fields or fields[0] != 'cpu':
+        raise ValueError(f"неожиданная строка /proc/stat: {line!r}")
+    # user nice system idle iowait irq softirq steal; guest уже учтен в user
+    values = [int(v) for v in fields[1:9]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    return sum(values), idle
+
+def parse_meminfo(output: str) -> Tuple[float, float]:
+    """
+    Разбор /proc/meminfo.
+
+    Returns:
+        Кортеж (всего кБ, занято кБ)
+    """
+    info = {}
+    for line in output.splitlines():
+        name, _, rest = line.partition(':')
+        if rest:
+            info[name.strip()] = float(rest.split()[0])
+    total = info['MemTotal']
+    available = info.get('MemAvailable')
+    if available is None:
+        available = info.get('MemFree', 0) + info.get('Buffers', 0) + info.get('Cached', 0)
+    return total, total - available
+
+def parse_statvfs(output: str) -> Tuple[float, float, float]:
+    """
+    Разбор вывода ``stat -f -c '%S %b %f %a'``.
+
+    Returns:
+        Кортеж (всего байт, занято байт, процент использования как у df)
+    """
+    block_size, blocks, free, available = (float(v) for v in output.split()[:4])
+    total = blocks * block_size
+    used = (blocks - free) * block_size
+    # df считает процент от места, доступного непривилегированным пользователям
+    usable = used + available * block_size
+    return total, used, _percent(used, usable)
+
+# Возраст предыдущих счетчиков /proc/stat, после которого разница с ними
+# уже не отражает текущую загрузку (два базовых интервала мониторинга)
+CPU_BASELINE_MAX_AGE = float(os.getenv("CPU_BASELINE_MAX_AGE", "600"))
+
+class CpuSampler:
+    """
+    Расчет загрузки CPU по разнице счетчиков /proc/stat между замерами.
+
+    Предыдущие счетчики хранятся отдельно для каждого хоста вместе
+    со временем замера; счетчики старше ``max_age`` не используются.
+    """
+    def __init__(self, max_age: float = CPU_BASELINE_MAX_AGE):
+        self.max_age = max_age
+        self._counters: Dict[Hashable, Tuple[float, Tuple[int, int]]] = {}
+
+    def _baseline(self, key: Hashable) -> Optional[Tuple[int, int]]:
+        entry = self._counters.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            return None
+        return entry[1]
+
+    def has_baseline(self, key: Hashable) -> bool:
+        """Есть ли достаточно свежие счетчики для замера без паузы."""
+        return self._baseline(key) is not None
+
+    def reset(self, key: Hashable):
+        self._counters.pop(key, None)
+
+    def update(self, key: Hashable, stat_output: str) -> float:
+        """
+        Обновление счетчиков хоста и расчет загрузки в процентах.
+
+        Если вывод содержит две строки (замер с паузой), разница считается
+        между ними. Без предыдущего замера возвращается средняя загрузка
+        с момента загрузки системы.
+        """
+        samples = [parse_proc_stat(line) for line in stat_output.splitlines() if line.strip()]
+        if not samples:
+            raise ValueError("пустой вывод /proc/stat")
+
+        current = samples[-1]
+        previous = samples[-2] if len(samples) > 1 else self._baseline(key)
+        self._counters[key] = (time.monotonic(), current)
+
+        if previous is not None:
+            total_delta = current[0] - previous[0]
+            idle_delta = current[1] - previous[1]
+            # Отрицательная разница означает перезагрузку хоста
+            if total_delta > 0 and idle_delta >= 0:
+                return _percent(total_delta - idle_delta, total_delta)
+
+        return _percent(current[0] - current[1], current[0])
+
+def linux_live(sampler: CpuSampler, key: Hashable, data: Dict[str, str]) -> Dict[str, float]:
+    """
+    Текущие показатели Linux из вывода LINUX_METRICS_COMMANDS.
+
+    Returns:
+        Проценты 'cpu', 'ram', 'disk' и абсолютные объемы
+        'ram_total_kb', 'ram_used_kb', 'disk_total', 'disk_used' (байты).
+        Показатели, которые не удалось разобрать, отсутствуют.
+    """
+    live: Dict[str, float] = {}
+    try:
+        live['cpu'] = sampler.update(key, data['stat'])
+    except (KeyError, ValueError, IndexError):
+        pass
+    try:
+        ram_total, ram_used = parse_meminfo(data['meminfo'])
+        live.update(ram=_percent(ram_used, ram_total), ram_total_kb=ram_total, ram_used_kb=ram_used)
+    except (KeyError, ValueError, IndexError):
+        pass
+    try:
+        disk_total, disk_used, disk_percent = parse_statvfs(data['fs'])
+        live.update(disk=disk_percent, disk_total=disk_total, disk_used=disk_used)
+    except (KeyError, ValueError, IndexError):
+        pass
+    return live
+
+def linux_usage(sampler: CpuSampler, key: Hashable, data: Dict[str, str]) -> Dict[str, float]:
+    """Расчет процентов использования cpu/ram/disk из вывода LINUX_METRICS_COMMANDS."""
+    live = linux_live(sampler, key, data)
+    return {resource: live[resource] for resource in ('cpu', 'ram', 'disk')}
+
+# Общий для всего процесса сборщик счетчиков CPU
+cpu_sampler = CpuSampler()
+
+# Сбор всех показателей Windows одним запуском PowerShell: каждый
+# CIM-класс запрашивается один раз, результат выводится в виде JSON
+WINDOWS_SCRIPT = """
+$ErrorActionPreference = 'SilentlyContinue'
+$os = Get-CimInstance Win32_OperatingSystem
+$cpu = @(Get-CimInstance Win32_Processor)
+$disk = Get-CimInstance Win32_LogicalDisk -Filter "DeviceID='C:'"
+[pscustomobject]@{
+    user = $env:USERNAME
+    os_name = $os.Caption
+    os_version = $os.Version
+    cpu_model = $cpu[0].Name
+    cpu_cores = ($cpu | Measure-Object -Property NumberOfLogicalProcessors -Sum).Sum
+    cpu_load = ($cpu | Measure-Object -Property LoadPercentage -Average).Average
+    ram_total_kb = $os.TotalVisibleMemorySize
+    ram_free_kb = $os.FreePhysicalMemory
+    disk_total = $disk.Size
+    disk_free = $disk.FreeSpace
+} | ConvertTo-Json -Compress
+"""
+
+# Облегченный вариант только с текущими показателями нагрузки
+WINDOWS_METRICS_SCRIPT = """
+$ErrorActionPreference = 'SilentlyContinue'
+$os = Get-CimInstance Win32_OperatingSystem -Property TotalVisibleMemorySize,FreePhysicalMemory
+$cpu = @(Get-CimInstance Win32_Processor -Property LoadPercentage)
+$disk = Get-CimInstance Win32_LogicalDisk -Filter "DeviceID='C:'" -Property Size,FreeSpace
+[pscustomobject]@{
+    cpu_load = ($cpu | Measure-Object -Property LoadPercentage -Average).Average
+    ram_total_kb = $os.TotalVisibleMemorySize
+    ram_free_kb = $os.FreePhysicalMemory
+    disk_total = $disk.Size
+    disk_free = $disk.FreeSpace
+} | ConvertTo-Json -Compress
+"""
+
+def build_powershell_command(script: str) -> str:
+    """Упаковка скрипта в -EncodedCommand, чтобы избежать проблем с кавычками."""
+    encoded = base64.b64encode(script.strip().encode('utf-16-le')).decode('ascii')
+    return f"powershell -NoProfile -NonInteractive -EncodedCommand {encoded}"
+
+WINDOWS_COMMAND = build_powershell_command(WINDOWS_SCRIPT)
+WINDOWS_METRICS_COMMAND = build_powershell_command(WINDOWS_METRICS_SCRIPT)
+
+def parse_windows_output(output: str) -> Optional[Dict[str, Any]]:
+    """Разбор JSON-вывода PowerShell-скрипта. Возвращает None при ошибке."""
+    for line in reversed(output.splitlines()):
+        line = line.strip()
+        if line.startswith('{'):
+            try:
+                data = json.loads(line)
+            except ValueError:
+                return None
+            return data if isinstance(data, dict) else None
+    return None
+
+def windows_facts(data: Dict[str, Any]) -> Dict[str, str]:
+    """Статичные сведения Windows с ключами, как у LINUX_FACTS_COMMANDS."""
+    return {
+        'user': data.get('user') or 'Неизвестно',
+        'os_info': data.get('os_name') or 'Неизвестно',
+        'kernel': data.get('os_version') or 'Неизвестно',
+        'cpu_info': data.get('cpu_model') or 'Неизвестно',
+        'cpu_cores': f"{data.get('cpu_cores') or 'Неизвестно'}"
+    }
+
+def windows_live(data: Dict[str, Any]) -> Dict[str, float]:
+    """Текущие показатели Windows в формате linux_live."""
+    def number(key: str) -> float:
+        try:
+            return float(data.get(key) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    ram_total = number('ram_total_kb')
+    ram_used = ram_total - number('ram_free_kb')
+    disk_total = number('disk_total')
+    disk_used = disk_total - number('disk_free')
+    return {
+        'cpu': number('cpu_load'),
+        'ram': _percent(ram_used, ram_total),
+        'disk': _percent(disk_used, disk_total),
+        'ram_total_kb': ram_total,
+        'ram_used_kb': ram_used,
+        'disk_total': disk_total,
+        'disk_used': disk_used
+    }
+
+def windows_usage(data: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Расчет процентов использования cpu/ram/disk из данных Windows.
+
+    Raises:
+        ValueError: если в выводе нет загрузки CPU или объемов памяти и диска
+    """
+    live = windows_live(data)
+    if data.get('cpu_load') is None or not live['ram_total_kb'] or not live['disk_total']:
+        raise ValueError("неполные данные Windows")
+    return {resource: live[resource] for resource in ('cpu', 'ram', 'disk')}
+
+# Время жизни кэша: статичные сведения (ОС, ядро, процессор) меняются
+# редко, текущая нагрузка устаревает быстро
+FACTS_TTL = int(os.getenv("FACTS_TTL", str(6 * 3600)))
+LIVE_TTL = int(os.getenv("LIVE_TTL", "15"))
+
+class HostFactsCache:
+    """
+    Двухуровневый кэш данных хоста для отчетов.
+
+    Статичные сведения живут ``facts_ttl`` секунд, текущие показатели -
+    ``live_ttl``. Записи привязаны к токену сессии (номер подключения и
+    отпечаток ключа хоста), поэтому переподключение или смена ключа хоста
+    делает их недействительными.
+    """
+    def __init__(self, facts_ttl: int = FACTS_TTL, live_ttl: int = LIVE_TTL):
+        self.facts_ttl = facts_ttl
+        self.live_ttl = live_ttl
+        self._facts: Dict[Hashable, Tuple[float, Hashable, Dict[str, str]]] = {}
+        self._live: Dict[Hashable, Tuple[float, Hashable, Dict[str, float]]] = {}
+
+    @staticmethod
+    def _lookup(store: dict, key: Hashable, token: Hashable, ttl: int):
+        entry = store.get(key)
+        if entry is None:
+            return None
+        fetched_at, cached_token, data = entry
+        if cached_token != token or time.time() - fetched_at >= ttl:
+            del store[key]
+            return None
+        return data
+
+    def get_facts(self, key: Hashable, token: Hashable) -> Optional[Dict[str, str]]:
+        return self._lookup(self._facts, key, token, self.facts_ttl)
+
+    def set_facts(self, key: Hashable, token: Hashable, data: Dict[str, str]):
+        self._facts[key] = (time.time(), token, data)
+
+    def get_live(self, key: Hashable, token: Hashable) -> Optional[Dict[str, float]]:
+        return self._lookup(self._live, key, token, self.live_ttl)
+
+    def set_live(self, key: Hashable, token: Hashable, data: Dict[str, float]):
+        self._live[key] = (time.time(), token, data)
+
+    def invalidate(self, key: Hashable):
+        self._facts.pop(key, None)
+        self._live.pop(key, None)
+
+# Общий кэш сведений о хостах
+host_cache = HostFactsCache()
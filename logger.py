@@ -1,39 +1,204 @@
 import os
+import json
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import multiprocessing
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from datetime import datetime
+from typing import Dict, List, Tuple
 
-LOGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+LOGS_PATH = os.getenv("LOGS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"))
 
 # Создаем папку для логов если её нет
 os.makedirs(LOGS_PATH, exist_ok=True)
 
 LOG_FILE = os.path.join(LOGS_PATH, "debug.log")
 
+# Формат файла логов: json (по строке JSON на запись) или text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Одинаковые сообщения уровня WARNING и выше: не больше LOG_RATE_LIMIT_BURST
+# за LOG_RATE_LIMIT_WINDOW секунд, остальные подавляются
+LOG_RATE_LIMIT_WINDOW = float(os.getenv("LOG_RATE_LIMIT_WINDOW", "60"))
+LOG_RATE_LIMIT_BURST = int(os.getenv("LOG_RATE_LIMIT_BURST", "3"))
+
+# Дополнительные поля записи, которые попадают в вывод
+EXTRA_FIELDS = ('trace_id', 'suppressed', 'trace')
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат с дополнительными полями в конце строки."""
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        extras = [f"{name}={json.dumps(getattr(record, name), ensure_ascii=False)}"
+                  for name in EXTRA_FIELDS if getattr(record, name, None) is not None]
+        return f"{text} {' '.join(extras)}" if extras else text
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной строкой JSON."""
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for name in EXTRA_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class ContextFilter(logging.Filter):
+    """Добавление идентификатора трассировки текущего запроса."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'trace_id', None) is None:
+            # Импорт здесь: tracing сам использует этот модуль
+            from tracing import current_trace_id
+            record.trace_id = current_trace_id()
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничение повторов одинаковых сообщений.
+
+    Сообщение с тем же уровнем и текстом пропускается не больше ``burst``
+    раз за ``window`` секунд. Число подавленных повторов добавляется
+    в поле ``suppressed`` первой записи следующего окна.
+    """
+    MAX_KEYS = 1000
+
+    def __init__(self, window: float = LOG_RATE_LIMIT_WINDOW, burst: int = LOG_RATE_LIMIT_BURST,
+                 level: int = logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.level = level
+        # (уровень, текст) -> [начало окна, пропущено в окне, подавлено]
+        self._seen: Dict[Tuple[int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level or self.window <= 0:
+            return True
+        key = (record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                if len(self._seen) >= self.MAX_KEYS:
+                    self._prune(now)
+                self._seen[key] = [now, 1, 0]
+                if entry is not None and entry[2]:
+                    record.suppressed = entry[2]
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            return False
+
+    def _prune(self, now: float):
+        for key, entry in list(self._seen.items()):
+            if now - entry[0] >= self.window:
+                del self._seen[key]
+        if len(self._seen) >= self.MAX_KEYS:
+            self._seen.clear()
+
+class _QueueHandler(QueueHandler):
+    """
+    Передача записей в очередь без форматирования.
+
+    Стандартный QueueHandler дописывает трассировку исключения в текст
+    сообщения; здесь она сохраняется отдельно в exc_text.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
 # Настройка форматирования
-formatter = logging.Formatter(
+text_formatter = TextFormatter(
     fmt='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
+formatter = JsonFormatter() if LOG_FORMAT == "json" else text_formatter
 
-# Настройка ротации логов: каждый день в полночь
-handler = TimedRotatingFileHandler(
-    LOG_FILE,
-    when="midnight",
-    interval=1,
-    backupCount=7,  # Хранить логи за последнюю неделю
-    encoding='utf-8'
-)
-handler.setFormatter(formatter)
-handler.suffix = "%Y%m%d"  # Формат суффикса для файлов логов
+def _make_handlers() -> list:
+    # Настройка ротации логов: каждый день в полночь
+    handler = TimedRotatingFileHandler(
+        LOG_FILE,
+        when="midnight",
+        interval=1,
+        backupCount=7,  # Хранить логи за последнюю неделю
+        encoding='utf-8'
+    )
+    handler.setFormatter(formatter)
+    handler.suffix = "%Y%m%d"  # Формат суффикса для файлов логов
+    result = [handler]
+
+    # Добавляем обработчик для вывода в консоль при разработке
+    if os.getenv("DEBUG"):
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(text_formatter)
+        result.append(console_handler)
+    return result
+
+def _make_queue_handler(target) -> QueueHandler:
+    result = _QueueHandler(target)
+    result.addFilter(RateLimitFilter())
+    result.addFilter(ContextFilter())
+    return result
+
+# Файл логов открывает и ротирует только основной процесс: рабочие
+# процессы (spawn) импортируют этот модуль заново и передают записи
+# основному через очередь, см. start_worker_logging
+handlers = [] if multiprocessing.parent_process() is not None else _make_handlers()
+
+# Запись в файл и ротация выполняются в потоке QueueListener,
+# event loop только кладет запись в очередь
+log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+queue_handler = _make_queue_handler(log_queue)
+_listeners: List[QueueListener] = []
+if handlers:
+    _listeners.append(QueueListener(log_queue, *handlers, respect_handler_level=True))
+    _listeners[0].start()
+
+def start_worker_logging(context) -> "multiprocessing.Queue":
+    """
+    Очередь для записей рабочих процессов, созданных из ``context``.
+
+    Записи из нее пишутся в лог основного процесса; очередь передается
+    в setup_worker_logging при инициализации рабочего процесса.
+    """
+    worker_queue = context.Queue()
+    listener = QueueListener(worker_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return worker_queue
+
+def setup_worker_logging(worker_queue: "multiprocessing.Queue"):
+    """Передача записей рабочего процесса в лог основного процесса."""
+    logger.removeHandler(queue_handler)
+    logger.addHandler(_make_queue_handler(worker_queue))
+
+def stop_logging():
+    """Запись оставшихся сообщений и остановка потоков логирования."""
+    while _listeners:
+        _listeners.pop().stop()
+
+atexit.register(stop_logging)
 
 # Настройка логгера
 logger = logging.getLogger("server-stats-bot")
 logger.setLevel(logging.INFO)
-logger.addHandler(handler)
-
-# Добавляем обработчик для вывода в консоль при разработке
-if os.getenv("DEBUG"):
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
\ No newline at end of file
+logger.addHandler(queue_handler)
@@ -1,44 +1,50 @@
+import asyncio
+import hmac
 import os
-import matplotlib # type: ignore
-matplotlib.use('Agg')  # Установка backend до импорта pyplot
-from datetime import datetime, timezone, timedelta
+import time
+from datetime import datetime
 from io import BytesIO
-from matplotlib.figure import Figure # type: ignore
+from typing import TYPE_CHECKING, Optional
+from startup import FirstUpdateMiddleware, startup_timer
 from aiogram import Bot, Dispatcher, types  # type: ignore
-from aiogram.utils.executor import start_polling  # type: ignore
-from reportlab.lib.pagesizes import letter  # type: ignore
-from reportlab.lib import colors  # type: ignore
-from reportlab.lib.units import inch  # type: ignore
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image  # type: ignore
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle  # type: ignore
-from reportlab.lib.enums import TA_CENTER, TA_LEFT  # type: ignore
-from reportlab.pdfbase import pdfmetrics  # type: ignore
-from reportlab.pdfbase.ttfonts import TTFont  # type: ignore
-import paramiko  # type: ignore
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer  # type: ignore
+from aiogram.utils.executor import set_webhook, start_polling  # type: ignore
+from aiohttp import web  # type: ignore
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton # type: ignore
-from monitoring import SystemMonitor
+from monitoring import SystemMonitor, format_size
+from collectors import (
+    LINUX_FACTS_COMMANDS, LINUX_METRICS_COMMANDS, LINUX_REPORT_COMMANDS, WINDOWS_COMMAND,
+    WINDOWS_METRICS_COMMAND, build_batch_script, cpu_sampler, host_cache, linux_live,
+    parse_batch_output, parse_windows_output, windows_facts, windows_live, with_cpu_baseline
+)
 from logger import logger
+from report_pool import ReportQueueFull, ReportRenderPool
+from report_store import ReportStore
+from state_store import CREDENTIALS, LOCKOUTS, USER_STATES, StateStore
+import telemetry
+from telemetry import TELEGRAM_ERRORS, TELEGRAM_REQUEST_SECONDS, MetricsServer
+from tracing import span, trace
+import ssh_transport
+from ssh_transport import PooledConnection, ssh_pool
 
-# Константы и настройки
-PDF_STORAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf-storage")
-LOGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
-FONTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+if TYPE_CHECKING:
+    import paramiko  # type: ignore
+
+startup_timer.mark("модули загружены")
 
-MAX_FILES = 10
-DEFAULT_FONT = 'DejaVuSans'
+# Константы и настройки
 ALERT_COOLDOWN = 3600  # 1 час
 MAX_FAILED_ATTEMPTS = 3
 LOCKOUT_TIME = 300  # 5 минут блокировки
-
-# Создание необходимых директорий
-for path in [LOGS_PATH, PDF_STORAGE_PATH]:
-    os.makedirs(path, exist_ok=True)
+STATUS_TREND_STEP = 1.0  # изменение в п.п., после которого показывается стрелка
 
 # Сообщения бота
 BOT_MESSAGES = {
     'start': ("🤖 *Бот мониторинга серверов*\n\n"
              "📋 Доступные команды:\n"
+             "/status - Текущая нагрузка\n"
              "/log - Отчет о системе\n"
+             "/reports - Последние отчеты\n"
              "/ssh - Настройка подключения\n"
              "/start_monitor - Включить мониторинг\n"
              "/stop_monitor - Выключить мониторинг"),
@@ -58,42 +64,82 @@ BOT_MESSAGES = {
     'no_ssh': "❌ SSH не настроен. Используйте /ssh для настройки",
     'report_generating': "📊 Генерация отчета...",
     'report_error': "❌ Ошибка создания отчета",
+    'report_busy': "⏳ Сервер занят подготовкой других отчетов. Повторите запрос через минуту.",
+    'reports_list': "🗂 Последние отчеты:",
+    'no_reports': "❗ Сохраненных отчетов нет. Используйте /log для создания отчета",
+    'report_expired': "Отчет больше не доступен",
+    'status': ("📈 *Состояние* `{host}`\n\n"
+               "Процессор: {cpu}\n"
+               "ОЗУ: {ram}\n"
+               "Диск: {disk}\n\n"
+               "_Замер {age}_"),
+    'status_error': "❌ Не удалось получить данные о нагрузке",
     'rate_limit': "⚠️ Слишком много попыток. Подождите {minutes} мин."
 }
 
-def register_fonts():
-    """Регистрация шрифтов с обработкой ошибок."""
-    try:
-        font_path = os.path.join(FONTS_PATH, "DejaVuSans.ttf")
-        if os.path.exists(font_path):
-            pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
-            logger.info("Шрифт DejaVuSans успешно зарегистрирован")
-            return True
-        logger.error("Файл шрифта не найден")
-        return False
-    except Exception as e:
-        logger.error(f"Ошибка регистрации шрифта: {e}")
-        return False
-
-if not register_fonts():
-    raise ValueError("Не удалось зарегистрировать необходимые шрифты")
-
 # Проверка и получение токена
 TOKEN = os.getenv("BOT_TOKEN")
 if not TOKEN:
     logger.error("BOT_TOKEN не задан в переменных окружения")
     raise ValueError("BOT_TOKEN не задан")
 
+# Режим webhook включается заданием WEBHOOK_URL (внешний адрес бота),
+# иначе используется long polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Секрет, который Telegram передает в заголовке каждого запроса webhook;
+# без него режим webhook не запускается
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+if WEBHOOK_URL and not WEBHOOK_SECRET:
+    logger.error("Для режима webhook нужно задать WEBHOOK_SECRET")
+    raise ValueError("WEBHOOK_SECRET не задан")
+# Адрес Bot API, например локального telegram-bot-api сервера
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+class InstrumentedBot(Bot):
+    """Бот с замером длительности запросов к Bot API."""
+    async def request(self, method, data=None, files=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except Exception:
+            TELEGRAM_ERRORS.inc(method)
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+
 # Инициализация бота
-bot = Bot(token=TOKEN)
+bot = InstrumentedBot(
+    token=TOKEN,
+    server=TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else TELEGRAM_PRODUCTION
+)
 dp = Dispatcher(bot)
-monitor = SystemMonitor(bot)
-
-# Состояния и кэши
-user_states = {}
-ssh_connections = {}
+dp.middleware.setup(FirstUpdateMiddleware())
+state_store = StateStore()
+monitor = SystemMonitor(bot, state_store)
+report_pool = ReportRenderPool()
+report_store = ReportStore()
+metrics_server = MetricsServer() if telemetry.METRICS_PORT else None
+
+# Метрики, вычисляемые в момент опроса эндпоинта
+telemetry.gauge('ssb_monitored_hosts', 'Хосты на мониторинге', lambda: len(monitor.subscribers))
+telemetry.gauge('ssb_monitoring_users', 'Пользователи с включенным мониторингом', lambda: len(monitor.monitored))
+telemetry.gauge('ssb_scheduled_checks', 'Проверки в планировщике', lambda: len(monitor.scheduler))
+telemetry.gauge('ssb_ssh_pool_sessions', 'Сессии в пуле SSH', lambda: len(ssh_pool.connections))
+telemetry.gauge('ssb_report_queue', 'Отчеты в очереди рендеринга', lambda: report_pool.pending)
+telemetry.gauge('ssb_outbox_pending', 'Уведомления в очереди отправки', lambda: monitor.outbox.pending)
+
+# Состояния и кэши, восстановленные после перезапуска
+user_states = state_store.load(USER_STATES)
+ssh_connections = state_store.load(CREDENTIALS)
 failed_attempts = {}
 locked_users = {}
+for _user_id, _lockout in state_store.load(LOCKOUTS).items():
+    failed_attempts[_user_id] = _lockout['failed']
+    if _lockout.get('locked_at') is not None:
+        locked_users[_user_id] = datetime.fromtimestamp(_lockout['locked_at'])
 
 # Запрещенные хосты
 BLOCKED_HOSTS = {
@@ -105,21 +151,6 @@ BLOCKED_HOSTS = {
     'fc00::/7'
 }
 
-def cleanup_old_pdfs():
-    """Очистка старых PDF файлов с логированием."""
-    try:
-        files = sorted(
-            [os.path.join(PDF_STORAGE_PATH, f) for f in os.listdir(PDF_STORAGE_PATH) 
-             if f.endswith('.pdf')],
-            key=os.path.getmtime
-        )
-        if len(files) > MAX_FILES:
-            for file in files[:-MAX_FILES]:
-                os.remove(file)
-                logger.info(f"Удален старый файл: {file}")
-    except Exception as e:
-        logger.error(f"Ошибка при очистке старых файлов: {e}")
-
 def is_host_allowed(hostname: str) -> bool:
     """Проверка безопасности хоста."""
     try:
@@ -137,6 +168,29 @@ def is_host_allowed(hostname: str) -> bool:
     except Exception:
         return False
 
+def set_user_state(user_id: int, state: Optional[dict]):
+    """Изменение состояния диалога с сохранением в базу."""
+    if state is None:
+        user_states.pop(user_id, None)
+    else:
+        user_states[user_id] = state
+    state_store.save(USER_STATES, user_id, state)
+
+def set_ssh_connection(user_id: int, ssh_data: Optional[dict]):
+    """Изменение параметров SSH с сохранением в базу в зашифрованном виде."""
+    if ssh_data is None:
+        ssh_connections.pop(user_id, None)
+    else:
+        ssh_connections[user_id] = ssh_data
+    state_store.save(CREDENTIALS, user_id, ssh_data)
+
+def save_lockout(user_id: int):
+    locked_at = locked_users.get(user_id)
+    state_store.save(LOCKOUTS, user_id, {
+        'failed': failed_attempts.get(user_id, 0),
+        'locked_at': locked_at.timestamp() if locked_at is not None else None
+    })
+
 def check_rate_limit(user_id: int) -> bool:
     """Проверка ограничения попыток."""
     current_time = datetime.now()
@@ -145,6 +199,7 @@ def check_rate_limit(user_id: int) -> bool:
             return False
         del locked_users[user_id]
         failed_attempts[user_id] = 0
+        save_lockout(user_id)
     return True
 
 def record_failed_attempt(user_id: int):
@@ -152,110 +207,135 @@ def record_failed_attempt(user_id: int):
     failed_attempts[user_id] = failed_attempts.get(user_id, 0) + 1
     if failed_attempts[user_id] >= MAX_FAILED_ATTEMPTS:
         locked_users[user_id] = datetime.now()
+    save_lockout(user_id)
 
-async def execute_ssh_command(ssh_client: paramiko.SSHClient, command: str, timeout: int = 10) -> str:
+async def execute_ssh_command(ssh_client: "paramiko.SSHClient", command: str, timeout: int = 10) -> str:
     """Выполнение SSH команды с обработкой ошибок."""
     try:
-        _, stdout, stderr = ssh_client.exec_command(command, timeout=timeout)
-        error = stderr.read().decode().strip()
+        output, error = await ssh_transport.exec_command(ssh_client, command, timeout=timeout)
+        error = error.strip()
         if error:
             logger.warning(f"SSH команда вернула ошибку: {error}")
-        return stdout.read().decode().strip()
+        return output.strip()
     except Exception as e:
-        logger.error(f"Ошибка выполнения '{command}': {e}")
+        logger.error(f"Ошибка выполнения '{ssh_transport.command_label(command)}': {e}")
         return "Неизвестно"
 
-async def get_linux_system_info(ssh_client: paramiko.SSHClient) -> dict:
-    """Сбор информации о Linux системе."""
+def format_system_report(facts: dict, live: dict) -> dict:
+    """Сведения для отчета из статичных данных хоста и текущих показателей."""
+    try:
+        ram_text = (f"{format_size(live['ram_used_kb'] / 1024, 'MB')} / "
+                    f"{format_size(live['ram_total_kb'] / 1024, 'MB')}")
+    except KeyError:
+        ram_text = "Неизвестно"
     try:
-        commands = {
-            'os_info': "grep PRETTY_NAME /etc/os-release | cut -d= -f2 | tr -d '\"'",
-            'kernel': "uname -r",
-            'cpu_info': "grep 'model name' /proc/cpuinfo | head -n 1 | cut -d: -f2 | xargs",
-            'cpu_cores': "nproc",
-            'cpu_load': "top -bn1 | grep 'Cpu(s)' | awk '{print $2}'",  # Изменено для более точного получения CPU
-            'ram_total': "free -m | awk '/Mem:/ {print $2}'",
-            'ram_used': "free -m | awk '/Mem:/ {print $3}'",
-            'disk_info': "df -h / | awk 'NR==2 {print $2,$3,$5}'"  # Получаем всю информацию о диске одной командой
-        }
+        disk_text = (f"{format_size(live['disk_used'] / 1024 ** 3, 'GB')} / "
+                     f"{format_size(live['disk_total'] / 1024 ** 3, 'GB')}")
+    except KeyError:
+        disk_text = "Неизвестно"
+
+    return {
+        'Пользователь': facts.get('user') or 'Неизвестно',
+        'Операционная система': facts.get('os_info') or 'Неизвестно',
+        'Версия ОС': facts.get('kernel') or 'Неизвестно',
+        'Процессор': facts.get('cpu_info') or 'Неизвестно',
+        'Количество ядер': facts.get('cpu_cores') or 'Неизвестно',
+        'Загрузка процессора': f"{live.get('cpu', 0)}",
+        'Оперативная память': ram_text,
+        'Использование ОЗУ': f"{live.get('ram', 0)}",
+        'Объем диска': disk_text,
+        'Использование диска': f"{live.get('disk', 0)}"
+    }
+
+async def collect_linux_batched(conn: PooledConnection) -> Optional[dict]:
+    """
+    Сбор сведений Linux одним SSH-запросом с учетом кэша хоста.
+
+    Запрашиваются только устаревшие уровни: статичные сведения, текущие
+    показатели или оба. Если оба уровня свежие, SSH-запрос не выполняется.
+
+    Returns:
+        Сведения для отчета или None, если пакетный скрипт не отработал
+    """
+    token = conn.cache_token
+    facts = host_cache.get_facts(conn.key, token)
+    live = host_cache.get_live(conn.key, token)
+
+    commands = {}
+    if facts is None:
+        commands.update(LINUX_FACTS_COMMANDS)
+    if live is None:
+        commands.update(LINUX_METRICS_COMMANDS if cpu_sampler.has_baseline(conn.host_key)
+                        else with_cpu_baseline(LINUX_METRICS_COMMANDS))
+
+    if commands:
+        output = await execute_ssh_command(conn.client, build_batch_script(commands))
+        data = parse_batch_output(output, commands)
+        if data is None:
+            return None
+        if facts is None:
+            facts = {key: data[key] for key in LINUX_FACTS_COMMANDS}
+            host_cache.set_facts(conn.key, token, facts)
+        if live is None:
+            live = linux_live(cpu_sampler, conn.host_key, data)
+            host_cache.set_live(conn.key, token, live)
+
+    return format_system_report(facts, live)
+
+async def get_linux_system_info(ssh_client: "paramiko.SSHClient", host_key=None) -> dict:
+    """
+    Сбор информации о Linux системе отдельными командами.
 
+    Используется, если пакетный скрипт не удалось выполнить.
+
+    Args:
+        ssh_client: Активное SSH-подключение
+        host_key: Идентификатор хоста для расчета загрузки CPU по разнице замеров
+    """
+    try:
+        commands = (LINUX_REPORT_COMMANDS if cpu_sampler.has_baseline(host_key)
+                    else with_cpu_baseline(LINUX_REPORT_COMMANDS))
         system_data = {}
         for key, cmd in commands.items():
             system_data[key] = await execute_ssh_command(ssh_client, cmd)
 
-        # Обработка данных RAM
-        try:
-            ram_total = float(system_data['ram_total'])
-            ram_used = float(system_data['ram_used'])
-            ram_percent = (ram_used / ram_total * 100) if ram_total > 0 else 0
-            ram_text = f"{ram_used:.0f} MB / {ram_total:.0f} MB"
-        except:
-            ram_percent = 0
-            ram_text = "Неизвестно"
-
-        # Обработка данных диска
-        try:
-            disk_total, disk_used, disk_percent = system_data['disk_info'].split()
-            disk_text = f"{disk_used} / {disk_total}"
-            disk_percent = float(disk_percent.replace('%', ''))
-        except:
-            disk_text = "Неизвестно"
-            disk_percent = 0
-
-        # Обработка данных CPU
-        try:
-            cpu_percent = float(system_data['cpu_load'])
-        except:
-            cpu_percent = 0
-
-        return {
-            'Пользователь': await execute_ssh_command(ssh_client, 'whoami'),
-            'Операционная система': system_data['os_info'],
-            'Версия ОС': system_data['kernel'],
-            'Процессор': system_data['cpu_info'],
-            'Количество ядер': system_data['cpu_cores'],
-            'Загрузка процессора': f"{cpu_percent}",
-            'Оперативная память': ram_text,
-            'Использование ОЗУ': f"{ram_percent}",
-            'Объем диска': disk_text,
-            'Использование диска': f"{disk_percent}"
-        }
+        live = linux_live(cpu_sampler, host_key, system_data)
+        return format_system_report(system_data, live)
     except Exception as e:
         logger.error(f"Ошибка сбора информации Linux: {e}")
         return {}
 
-async def get_windows_system_info(ssh_client: paramiko.SSHClient) -> dict:
-    """Сбор информации о Windows системе."""
-    try:
-        commands = {
-            'cpu': 'powershell "$loadAvg=(Get-CimInstance Win32_Processor).LoadPercentage;$loadAvg"',
-            'ram': 'powershell "$os=Get-CimInstance Win32_OperatingSystem;[math]::Round(($os.TotalVisibleMemorySize-$os.FreePhysicalMemory)/$os.TotalVisibleMemorySize*100,1)"',
-            'disk': 'powershell "$disk=Get-PSDrive C;[math]::Round($disk.Used/($disk.Used+$disk.Free)*100,1)"',
-            'os_info': 'powershell "(Get-CimInstance Win32_OperatingSystem).Caption"',
-            'os_version': 'powershell "(Get-CimInstance Win32_OperatingSystem).Version"',
-            'cpu_info': 'powershell "(Get-CimInstance Win32_Processor).Name"',
-            'cpu_cores': 'powershell "(Get-CimInstance Win32_Processor).NumberOfLogicalProcessors"'
-        }
-
-        system_data = {}
-        for key, cmd in commands.items():
-            system_data[key] = await execute_ssh_command(ssh_client, cmd)
+async def get_windows_system_info(conn: PooledConnection) -> dict:
+    """
+    Сбор информации о Windows системе одним запуском PowerShell.
 
-        return {
-            'Пользователь': await execute_ssh_command(ssh_client, 'powershell "$env:USERNAME"'),
-            'Операционная система': system_data['os_info'],
-            'Версия ОС': system_data['os_version'],
-            'Процессор': system_data['cpu_info'],
-            'Количество ядер': system_data['cpu_cores'],
-            'Загрузка процессора': system_data['cpu'],
-            'Использование ОЗУ': system_data['ram'],
-            'Использование диска': system_data['disk']
-        }
+    Если статичные сведения есть в кэше, запрашиваются только текущие показатели.
+    """
+    try:
+        token = conn.cache_token
+        facts = host_cache.get_facts(conn.key, token)
+        live = host_cache.get_live(conn.key, token)
+        if facts is not None and live is not None:
+            return format_system_report(facts, live)
+
+        command = WINDOWS_COMMAND if facts is None else WINDOWS_METRICS_COMMAND
+        output = await execute_ssh_command(conn.client, command, timeout=30)
+        data = parse_windows_output(output)
+        if data is None:
+            logger.error("PowerShell-скрипт не вернул корректный JSON")
+            return {}
+
+        if facts is None:
+            facts = windows_facts(data)
+            host_cache.set_facts(conn.key, token, facts)
+        live = windows_live(data)
+        host_cache.set_live(conn.key, token, live)
+        return format_system_report(facts, live)
     except Exception as e:
         logger.error(f"Ошибка сбора информации Windows: {e}")
         return {}
 
-async def determine_os_type(ssh_client: paramiko.SSHClient) -> str:
+async def determine_os_type(ssh_client: "paramiko.SSHClient") -> str:
     """Определение типа ОС."""
     try:
         output = await execute_ssh_command(ssh_client, 'ver')
@@ -264,226 +344,33 @@ async def determine_os_type(ssh_client: paramiko.SSHClient) -> str:
         return "linux"
 
 async def get_system_info_ssh(hostname: str, port: int, username: str, password: str) -> dict:
-    """Подключение и сбор информации о системе."""
+    """Сбор информации о системе через общий пул SSH-сессий."""
+    ssh_data = {"hostname": hostname, "port": port, "username": username, "password": password}
     try:
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh_client.connect(
-            hostname=hostname,
-            port=port,
-            username=username,
-            password=password,
-            timeout=30
-        )
+        async with ssh_pool.lease(ssh_data) as conn:
+            if conn.os_type == "windows":
+                system_data = await get_windows_system_info(conn)
+            else:
+                # Пакетный скрипт отрабатывает только на Linux, поэтому его успех
+                # заодно определяет тип ОС без отдельного запроса
+                system_data = await collect_linux_batched(conn)
+                if system_data is not None:
+                    conn.os_type = "linux"
+                else:
+                    if conn.os_type is None:
+                        with span('os.detect'):
+                            conn.os_type = await determine_os_type(conn.client)
+                    if conn.os_type == "linux":
+                        logger.warning("Пакетный сбор не удался, выполняем команды по отдельности")
+                    system_data = (await get_windows_system_info(conn) if conn.os_type == "windows"
+                                  else await get_linux_system_info(conn.client, conn.host_key))
 
-        os_type = await determine_os_type(ssh_client)
-        system_data = (await get_windows_system_info(ssh_client) if os_type == "windows" 
-                      else await get_linux_system_info(ssh_client))
-        
         system_data.update({'IP-адрес': hostname, 'Порт SSH': port})
-        
-        ssh_client.close()
         return system_data
     except Exception as e:
         logger.error(f"Ошибка SSH подключения: {e}")
         return {}
 
-def add_resource_charts(elements: list, system_data: dict):
-    """Создание графиков использования ресурсов."""
-    try:
-        # Извлекаем и нормализуем значения из system_data
-        def extract_value(value_str):
-            try:
-                if isinstance(value_str, (int, float)):
-                    return float(value_str)
-                if isinstance(value_str, str):
-                    # Извлекаем первое число из строки
-                    import re
-                    numbers = re.findall(r'[\d.]+', value_str)
-                    return float(numbers[0]) if numbers else 0.0
-                return 0.0
-            except (ValueError, IndexError):
-                return 0.0
-
-        resources = [
-            ('Загрузка процессора', extract_value(system_data.get('Загрузка процессора'))),
-            ('Использование ОЗУ', extract_value(system_data.get('Использование ОЗУ'))),
-            ('Использование диска', extract_value(system_data.get('Использование диска')))
-        ]
-
-        # Создаем фигуру для графиков
-        fig = Figure(figsize=(12, 4))
-        colors = ['#FFB3BA', '#BAFFC9', '#BAE1FF']
-        bg_colors = ['#FFE5E8', '#E8FFE5', '#E5F2FF']
-
-        for idx, (title, value) in enumerate(resources):
-            value = max(0.0, min(100.0, value))  # Нормализация значений
-            ax = fig.add_subplot(131 + idx)
-            sizes = [value, 100 - value]
-            
-            # Добавляем проверку на нулевые значения
-            if value == 0 and sizes[1] == 100:
-                sizes = [0.01, 99.99]  # Минимальное значение для отображения
-
-            wedges, texts, autotexts = ax.pie(
-                sizes, 
-                colors=[colors[idx], bg_colors[idx]], 
-                startangle=90, 
-                autopct='%1.1f%%',
-                pctdistance=0.85,
-                wedgeprops={'edgecolor': 'white', 'linewidth': 1}
-            )
-            
-            # Настройка внешнего вида текста процентов
-            for autotext in autotexts:
-                autotext.set_color('black')
-                autotext.set_fontsize(9)
-            
-            ax.set_title(title, pad=20)
-
-        fig.tight_layout(pad=3.0)
-        
-        # Сохраняем график с высоким разрешением
-        buf = BytesIO()
-        fig.savefig(buf, format='png', bbox_inches='tight', dpi=300)
-        buf.seek(0)
-
-        img = Image(buf, width=7*inch, height=2.3*inch)
-        elements.append(img)
-        elements.append(Spacer(1, 0.2*inch))
-        
-    except Exception as e:
-        logger.error(f"Ошибка создания графиков: {e}")
-        elements.append(Paragraph(
-            "Не удалось создать графики использования ресурсов", 
-            ParagraphStyle('Error', fontName=DEFAULT_FONT, fontSize=12, textColor=colors.red)
-        ))
-
-def generate_system_report_pdf(system_data=None):
-    """
-    Генерирует PDF-отчет о состоянии системы.
-    
-    Создает структурированный отчет, включающий:
-    - Основную информацию о системе
-    - Графики использования ресурсов
-    - Подробные метрики работы
-    
-    Args:
-        system_data: Словарь с данными о системе
-        
-    Returns:
-        str: Путь к сгенерированному PDF-файлу или None при ошибке
-    """
-    try:
-        moscow_tz = timezone(timedelta(hours=3))
-        now = datetime.now(moscow_tz)
-        months_ru = {
-            1: "января", 2: "февраля", 3: "марта", 4: "апреля",
-            5: "мая", 6: "июня", 7: "июля", 8: "августа",
-            9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
-        }
-        current_date = f"{now.day} {months_ru[now.month]} {now.year} года"
-        filename_time = now.strftime("%Y%m%d_%H%M%S")
-        
-        logger.info("Начало генерации PDF-файла.")
-        
-        pdf_path = os.path.join(PDF_STORAGE_PATH, f"system_report_{filename_time}.pdf")
-        
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter, encoding='utf-8')
-        elements = []
-        
-        logger.info(f"Используем шрифт: {DEFAULT_FONT}")
-        
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            fontName=DEFAULT_FONT,
-            fontSize=18,
-            alignment=TA_CENTER,
-            leading=22
-        )
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            fontName=DEFAULT_FONT,
-            fontSize=14,
-            alignment=TA_LEFT,
-            spaceAfter=6,
-            leading=18
-        )
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            fontName=DEFAULT_FONT,
-            fontSize=12,
-            alignment=TA_LEFT,
-            leading=14
-        )
-        
-        elements.append(Paragraph("Отчет о состоянии системы", title_style))
-        elements.append(Spacer(1, 0.25*inch))
-        elements.append(Paragraph(f"Сгенерировано: {current_date}", normal_style))
-        elements.append(Spacer(1, 0.5*inch))
-        
-        elements.append(Paragraph("Основная информация", heading_style))  # Убрана лишняя скобка
-        
-        if system_data:
-            system_data_list = [
-                ["Параметр", "Значение"],
-                ["Пользователь", system_data.get('Пользователь', '—')],
-                ["IP-адрес", system_data.get('IP-адрес', '—')],
-                ["Порт SSH", system_data.get('Порт SSH', '—')],
-                ["Операционная система", system_data.get('Операционная система', '—')],
-                ["Версия ОС", system_data.get('Версия ОС', '—')],
-                ["Процессор", system_data.get('Процессор', '—')],
-                ["Оперативная память", system_data.get('Оперативная память', '—')],
-                ["Объем диска", system_data.get('Объем диска', '—')]
-            ]
-        else:
-            system_data_list = [
-                ["Параметр", "Значение"],
-                ["Пользователь", "—"],
-                ["IP-адрес", "—"],
-                ["Порт SSH", "—"],
-                ["Операционная система", "—"],
-                ["Версия ОС", "—"],
-                ["Процессор", "—"],
-                ["Оперативная память", "—"],
-                ["Объем диска", "—"]
-            ]
-        
-        t = Table(system_data_list, colWidths=[2.5*inch, 4*inch])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), DEFAULT_FONT),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ]))
-        
-        elements.append(t)
-        elements.append(Spacer(1, 0.5*inch))
-        
-        elements.append(Paragraph("Использование ресурсов", heading_style))
-        elements.append(Spacer(1, 0.1*inch))
-        
-        add_resource_charts(elements, system_data)
-        
-        try:
-            doc.build(elements)
-            logger.info(f"PDF-файл '{pdf_path}' успешно создан.")
-        except Exception as pdf_error:
-            logger.error(f"Ошибка при сохранении PDF-файла: {pdf_error}")
-        
-        cleanup_old_pdfs()
-        
-        return pdf_path
-    except Exception as e:
-        logger.error(f"Ошибка при создании PDF: {e}", exc_info=True)
-        return None
-
 @dp.message_handler(commands=["start"])
 async def start_command(message: types.Message):
     """Начальное приветствие и список команд."""
@@ -514,25 +401,25 @@ async def ssh_command(message: types.Message):
         return
     
     sent_msg = await message.answer(BOT_MESSAGES['ssh_prompt'])
-    user_states[message.from_user.id] = {
+    set_user_state(message.from_user.id, {
         "state": "waiting_ssh",
         "message_id": sent_msg.message_id
-    }
+    })
 
 @dp.callback_query_handler(lambda c: c.data == 'cancel_ssh')
 async def cancel_ssh(callback_query: types.CallbackQuery):
     """Обработка отмены существующего SSH подключения."""
     try:
         if callback_query.from_user.id in ssh_connections:
-            del ssh_connections[callback_query.from_user.id]
+            set_ssh_connection(callback_query.from_user.id, None)
         
         await callback_query.message.delete()
         
         sent_msg = await callback_query.message.answer(BOT_MESSAGES['ssh_prompt'])
-        user_states[callback_query.from_user.id] = {
+        set_user_state(callback_query.from_user.id, {
             "state": "waiting_ssh",
             "message_id": sent_msg.message_id
-        }
+        })
         
         await callback_query.answer()
         
@@ -557,7 +444,8 @@ async def process_ssh_input(message: types.Message):
 
         orig_message_id = user_states[message.from_user.id]["message_id"]
         
-        user_states[message.from_user.id].update({
+        set_user_state(message.from_user.id, {
+            **user_states[message.from_user.id],
             "state": "waiting_password",
             "username": username,
             "hostname": hostname
@@ -573,7 +461,7 @@ async def process_ssh_input(message: types.Message):
     except Exception as e:
         logger.error(f"Ошибка при обработке SSH данных: {e}")
         await message.answer("Произошла ошибка при обработке данных")
-        user_states.pop(message.from_user.id, None)
+        set_user_state(message.from_user.id, None)
 
 @dp.message_handler(lambda message: isinstance(user_states.get(message.from_user.id), dict) and
                    user_states.get(message.from_user.id, {}).get("state") == "waiting_password")
@@ -587,26 +475,24 @@ async def process_password(message: types.Message):
 
         await message.delete()
 
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
         try:
-            ssh_client.connect(
+            ssh_client = await ssh_transport.connect(
                 hostname=hostname,
                 username=username,
                 password=password,
                 timeout=10
             )
-            ssh_client.close()
+            await ssh_transport.close(ssh_client)
             
             failed_attempts[message.from_user.id] = 0
+            save_lockout(message.from_user.id)
             
-            ssh_connections[message.from_user.id] = {
+            set_ssh_connection(message.from_user.id, {
                 "hostname": hostname,
                 "username": username,
                 "password": password,
                 "port": 22
-            }
+            })
             
             await message.answer(BOT_MESSAGES['ssh_success'])
         except Exception as ssh_error:
@@ -617,49 +503,151 @@ async def process_password(message: types.Message):
         logger.error(f"Ошибка при обработке пароля: {e}")
         await message.answer("Произошла ошибка при обработке данных")
     finally:
-        user_states.pop(message.from_user.id, None)
+        set_user_state(message.from_user.id, None)
 
 @dp.message_handler(commands=["log"])
 async def log_command(message: types.Message):
     """Генерация и отправка отчета о системе."""
-    try:
-        if message.from_user.id not in ssh_connections:
-            await message.answer(BOT_MESSAGES['no_ssh'])
-            return
+    with trace('log', user_id=message.from_user.id):
+        try:
+            if message.from_user.id not in ssh_connections:
+                await message.answer(BOT_MESSAGES['no_ssh'])
+                return
 
-        wait_message = await message.answer(BOT_MESSAGES['report_generating'])
+            with span('telegram.answer'):
+                wait_message = await message.answer(BOT_MESSAGES['report_generating'])
 
-        conn = ssh_connections[message.from_user.id]
-        
-        system_data = await get_system_info_ssh(
-            conn["hostname"],
-            conn.get("port", 22),
-            conn["username"],
-            conn["password"]
-        )
+            conn = ssh_connections[message.from_user.id]
+            host_key = (conn["hostname"], conn.get("port", 22))
+
+            async def collect() -> dict:
+                return await get_system_info_ssh(
+                    conn["hostname"],
+                    conn.get("port", 22),
+                    conn["username"],
+                    conn["password"]
+                )
 
-        pdf_file = generate_system_report_pdf(system_data)
-        if pdf_file and os.path.exists(pdf_file):
-            with open(pdf_file, "rb") as file:
-                await message.answer_document(file, caption="Отчет о системе")
+            # Одновременные отчеты с одинаковыми учетными данными объединяются
+            try:
+                with span('report'):
+                    pdf_data = await report_pool.submit(ssh_pool.make_key(conn), collect, host_key)
+            except ReportQueueFull:
+                await wait_message.edit_text(BOT_MESSAGES['report_busy'])
+                return
+
+            if pdf_data:
+                with span('report.store'):
+                    entry = report_store.add(message.from_user.id, conn["hostname"], pdf_data)
+                with span('telegram.answer_document'):
+                    await message.answer_document(
+                        types.InputFile(BytesIO(pdf_data), filename=entry.filename),
+                        caption="Отчет о системе"
+                    )
                 await wait_message.delete()
-        else:
-            await wait_message.edit_text(BOT_MESSAGES['report_error'])
-            logger.error("Не удалось создать отчет. Проверьте логи.")
-        
-        if not monitor.is_monitoring(message.from_user.id):
-            keyboard = InlineKeyboardMarkup()
-            keyboard.row(
-                InlineKeyboardButton("✅ Да", callback_data="monitor_start"),
-                InlineKeyboardButton("❌ Нет", callback_data="monitor_cancel")
-            )
-            await message.answer(
-                BOT_MESSAGES['monitoring_offer'],
-                reply_markup=keyboard
-            )
-    except Exception as e:
-        await message.answer("Произошла ошибка при выполнении команды. Проверьте логи.")
-        logger.error(f"Ошибка при выполнении команды /log: {e}", exc_info=True)
+            else:
+                await wait_message.edit_text(BOT_MESSAGES['report_error'])
+                logger.error("Не удалось создать отчет. Проверьте логи.")
+
+            if not monitor.is_monitoring(message.from_user.id):
+                keyboard = InlineKeyboardMarkup()
+                keyboard.row(
+                    InlineKeyboardButton("✅ Да", callback_data="monitor_start"),
+                    InlineKeyboardButton("❌ Нет", callback_data="monitor_cancel")
+                )
+                await message.answer(
+                    BOT_MESSAGES['monitoring_offer'],
+                    reply_markup=keyboard
+                )
+        except Exception as e:
+            await message.answer("Произошла ошибка при выполнении команды. Проверьте логи.")
+            logger.error(f"Ошибка при выполнении команды /log: {e}", exc_info=True)
+
+def trend_arrow(current: float, previous: Optional[float]) -> str:
+    """Стрелка изменения нагрузки относительно предыдущего замера."""
+    if previous is None:
+        return ""
+    delta = current - previous
+    if delta >= STATUS_TREND_STEP:
+        return f" ↑ +{delta:.1f}"
+    if delta <= -STATUS_TREND_STEP:
+        return f" ↓ {delta:.1f}"
+    return " →"
+
+def format_age(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} с назад"
+    if seconds < 3600:
+        return f"{seconds // 60} мин назад"
+    return f"{seconds // 3600} ч назад"
+
+@dp.message_handler(commands=["status"])
+async def status_command(message: types.Message):
+    """Краткая сводка нагрузки без генерации отчета."""
+    user_id = message.from_user.id
+    if user_id not in ssh_connections:
+        await message.answer(BOT_MESSAGES['no_ssh'])
+        return
+
+    conn = ssh_connections[user_id]
+    # Для хоста под мониторингом ответ строится из последнего замера без SSH
+    status = monitor.get_status(conn)
+    if status is not None:
+        latest, reference = status
+    else:
+        latest, reference = await monitor.sample_now(user_id, conn), None
+        if latest is None:
+            await message.answer(BOT_MESSAGES['status_error'])
+            return
+
+    values = {}
+    for resource in ('cpu', 'ram', 'disk'):
+        current = getattr(latest, resource)
+        previous = getattr(reference, resource) if reference is not None else None
+        values[resource] = f"{current:.1f}%{trend_arrow(current, previous)}"
+
+    await message.answer(
+        BOT_MESSAGES['status'].format(
+            host=f"{conn['hostname']}:{conn.get('port', 22)}",
+            age=format_age(time.time() - latest.timestamp),
+            **values
+        ),
+        parse_mode="Markdown"
+    )
+
+@dp.message_handler(commands=["reports"])
+async def reports_command(message: types.Message):
+    """Список последних отчетов пользователя для повторной отправки."""
+    entries = report_store.recent(message.from_user.id)
+    if not entries:
+        await message.answer(BOT_MESSAGES['no_reports'])
+        return
+
+    keyboard = InlineKeyboardMarkup()
+    for entry in entries:
+        created = datetime.fromtimestamp(entry.timestamp).strftime("%d.%m %H:%M")
+        keyboard.add(InlineKeyboardButton(
+            f"{entry.host} — {created} ({entry.size // 1024} КБ)",
+            callback_data=f"report_get:{entry.report_id}"
+        ))
+    await message.answer(BOT_MESSAGES['reports_list'], reply_markup=keyboard)
+
+@dp.callback_query_handler(lambda c: c.data.startswith('report_get:'))
+async def process_report_callback(callback_query: types.CallbackQuery):
+    """Повторная отправка сохраненного отчета без повторного рендеринга."""
+    report_id = callback_query.data.split(':', 1)[1]
+    stored = report_store.get(report_id)
+    if stored is None or stored[0].user_id != callback_query.from_user.id:
+        await callback_query.answer(BOT_MESSAGES['report_expired'], show_alert=True)
+        return
+
+    entry, pdf_data = stored
+    await callback_query.message.answer_document(
+        types.InputFile(BytesIO(pdf_data), filename=entry.filename),
+        caption="Отчет о системе"
+    )
+    await callback_query.answer()
 
 @dp.callback_query_handler(lambda c: c.data.startswith('monitor_'))
 async def process_monitor_callback(callback_query: types.CallbackQuery):
@@ -701,6 +689,80 @@ async def stop_monitor_command(message: types.Message):
     else:
         await message.answer(BOT_MESSAGES['monitoring_not_running'])
 
+# Ссылки на фоновые задачи, чтобы их не удалил сборщик мусора
+background_tasks = set()
+
+async def prewarm():
+    """
+    Фоновая загрузка тяжелых модулей после начала опроса: paramiko
+    в основном процессе, reportlab и шрифты в процессе рендеринга.
+    """
+    try:
+        await ssh_transport.run_blocking(ssh_transport.preload)
+        if not await report_pool.prewarm():
+            logger.error("Не удалось зарегистрировать необходимые шрифты")
+        startup_timer.mark("модули отчетов загружены")
+    except Exception as e:
+        logger.error(f"Ошибка предварительной загрузки модулей: {e}")
+
+async def on_startup(dispatcher: Dispatcher):
+    """Запуск фоновой записи состояния и восстановление мониторинга."""
+    startup_timer.mark("начало приема обновлений")
+    if metrics_server is not None:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.error(f"Не удалось запустить эндпоинт метрик: {e}")
+    state_store.start()
+    monitor.resume()
+    background_tasks.add(asyncio.create_task(prewarm()))
+
+async def on_shutdown(dispatcher: Dispatcher):
+    """Освобождение ресурсов при остановке бота."""
+    await monitor.shutdown()
+    await state_store.close()
+    report_pool.shutdown()
+    report_store.close()
+    await ssh_pool.close_all()
+    if metrics_server is not None:
+        await metrics_server.stop()
+
+async def on_webhook_startup(dispatcher: Dispatcher):
+    """Регистрация webhook; накопившиеся обновления отбрасываются, как при skip_updates."""
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        drop_pending_updates=True,
+        secret_token=WEBHOOK_SECRET
+    )
+
+async def on_webhook_shutdown(dispatcher: Dispatcher):
+    await bot.delete_webhook()
+
+@web.middleware
+async def check_webhook_secret(request: web.Request, handler):
+    """Отклонение запросов к webhook без правильного секрета."""
+    # Сравнение байтов: compare_digest не принимает строки с не-ASCII символами
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "").encode("utf-8", "surrogateescape")
+    if request.path == WEBHOOK_PATH and not hmac.compare_digest(token, WEBHOOK_SECRET.encode("utf-8")):
+        return web.Response(status=403)
+    return await handler(request)
+
+def run_webhook():
+    """Прием обновлений через webhook на aiohttp с теми же обработчиками."""
+    app = web.Application(middlewares=[check_webhook_secret])
+    executor = set_webhook(
+        dp,
+        WEBHOOK_PATH,
+        on_startup=[on_startup, on_webhook_startup],
+        on_shutdown=[on_webhook_shutdown, on_shutdown],
+        web_app=app
+    )
+    executor.run_app(host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+
 if __name__ == "__main__":
-    logger.info("Бот запущен")
-    start_polling(dp, skip_updates=True)
\ No newline at end of file
+    if WEBHOOK_URL:
+        logger.info(f"Бот запущен в режиме webhook на {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        run_webhook()
+    else:
+        logger.info("Бот запущен")
+        start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
\ No newline at end of file
@@ -0,0 +1,196 @@
+import mmap
+import os
+import re
+import struct
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Hashable, Optional, Tuple
+from logger import logger
+
+if TYPE_CHECKING:
+    import numpy as np  # type: ignore
+
+METRICS_STORAGE_PATH = os.getenv(
+    "METRICS_STORAGE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf-storage", "metrics")
+)
+# Сколько дней хранить замеры на диске
+METRICS_RETENTION_DAYS = float(os.getenv("METRICS_RETENTION_DAYS", "30"))
+
+# Запись фиксированного размера: метка времени и значения cpu/ram/disk
+RECORD = struct.Struct('<dfff')
+
+# Как часто (в записях) проверять необходимость сжатия файла
+COMPACT_CHECK_EVERY = 1024
+
+# numpy нужен только для чтения истории: запись обходится struct,
+# и основной процесс бота не загружает numpy при старте
+@lru_cache(maxsize=None)
+def _record_dtype() -> "np.dtype":
+    import numpy as np  # type: ignore
+    dtype = np.dtype([
+        ('timestamp', '<f8'),
+        ('cpu', '<f4'),
+        ('ram', '<f4'),
+        ('disk', '<f4')
+    ])
+    assert RECORD.size == dtype.itemsize
+    return dtype
+
+def _empty() -> "np.ndarray":
+    import numpy as np  # type: ignore
+    return np.zeros(0, dtype=_record_dtype())
+
+class HostSeriesFile:
+    """
+    Файл замеров одного хоста: последовательность записей RECORD.
+
+    Запись выполняется одним вызовом os.write в файл, открытый с O_APPEND,
+    чтение - через mmap без копирования данных.
+    """
+    def __init__(self, path: str, writable: bool = True):
+        self.path = path
+        self.writable = writable
+        flags = os.O_RDWR | os.O_CREAT | os.O_APPEND if writable else os.O_RDONLY
+        self._fd = os.open(path, flags, 0o644)
+        size = os.fstat(self._fd).st_size
+        if writable and size % RECORD.size:
+            # Обрезаем недописанную запись после аварийного завершения
+            size -= size % RECORD.size
+            os.ftruncate(self._fd, size)
+        self._count = size // RECORD.size
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped_count = 0
+        self._last_ts = self.timestamp_at(self._count - 1) if self._count else 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def timestamp_at(self, index: int) -> float:
+        """Метка времени записи ``index`` без отображения файла в память."""
+        # Запись в файл с O_APPEND всегда идет в конец, смещение ей не мешает
+        os.lseek(self._fd, index * RECORD.size, os.SEEK_SET)
+        return RECORD.unpack(os.read(self._fd, RECORD.size))[0]
+
+    def append(self, timestamp: float, cpu: float, ram: float, disk: float):
+        # Метки времени в файле не убывают, иначе поиск по диапазону сломается
+        timestamp = max(timestamp, self._last_ts)
+        os.write(self._fd, RECORD.pack(timestamp, cpu, ram, disk))
+        self._last_ts = timestamp
+        self._count += 1
+
+    def _refresh_count(self):
+        if not self.writable:
+            self._count = os.fstat(self._fd).st_size // RECORD.size
+
+    def _view(self) -> "np.ndarray":
+        """Все записи файла как массив numpy поверх mmap."""
+        import numpy as np  # type: ignore
+        if self._count == 0:
+            return _empty()
+        if self._count != self._mapped_count:
+            # Старое отображение освобождается сборщиком мусора,
+            # когда на него не останется ссылок из выданных срезов
+            self._mmap = mmap.mmap(self._fd, self._count * RECORD.size, access=mmap.ACCESS_READ)
+            self._mapped_count = self._count
+        return np.frombuffer(self._mmap, dtype=_record_dtype(), count=self._count)
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> "np.ndarray":
+        """Записи с меткой времени в интервале [start, end] без копирования."""
+        import numpy as np  # type: ignore
+        self._refresh_count()
+        view = self._view()
+        timestamps = view['timestamp']
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        last = len(view) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+        return view[first:last]
+
+    def latest(self, n: int) -> "np.ndarray":
+        self._refresh_count()
+        view = self._view()
+        return view[max(0, len(view) - n):]
+
+    def compact(self, before: float):
+        """Удаление записей старше ``before`` перезаписью файла."""
+        view = self.range(before)
+        if len(view) == self._count:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(view.tobytes())
+        os.replace(tmp_path, self.path)
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND, 0o644)
+        self._count = len(view)
+        self._mmap = None
+        self._mapped_count = 0
+
+    def close(self):
+        self._mmap = None
+        os.close(self._fd)
+
+class MetricsStore:
+    """
+    Хранилище истории замеров на диске: по одному файлу на хост.
+
+    Переживает перезапуск контейнера и не держит историю в памяти Python:
+    данные читаются через mmap по запросу.
+    """
+    def __init__(self, base_path: str = METRICS_STORAGE_PATH, writable: bool = True,
+                 retention_days: float = METRICS_RETENTION_DAYS):
+        self.base_path = base_path
+        self.writable = writable
+        self.retention = retention_days * 86400
+        self.files: Dict[Hashable, HostSeriesFile] = {}
+        if writable:
+            os.makedirs(base_path, exist_ok=True)
+
+    def path_for(self, host_key: Tuple[str, int]) -> str:
+        hostname, port = host_key
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', f"{hostname}_{port}")
+        return os.path.join(self.base_path, f"{name}.bin")
+
+    def _file(self, host_key: Tuple[str, int]) -> Optional[HostSeriesFile]:
+        series = self.files.get(host_key)
+        if series is None:
+            path = self.path_for(host_key)
+            if not self.writable and not os.path.exists(path):
+                return None
+            series = self.files[host_key] = HostSeriesFile(path, self.writable)
+        return series
+
+    def append(self, host_key: Tuple[str, int], timestamp: float, metrics: Dict[str, float]):
+        series = self._file(host_key)
+        series.append(
+            timestamp,
+            metrics.get('cpu', 0.0),
+            metrics.get('ram', 0.0),
+            metrics.get('disk', 0.0)
+        )
+        if len(series) % COMPACT_CHECK_EVERY == 0 and self.retention > 0:
+            cutoff = time.time() - self.retention
+            if series.timestamp_at(0) < cutoff:
+                try:
+                    series.compact(cutoff)
+                except OSError as e:
+                    logger.error(f"Ошибка сжатия файла метрик {series.path}: {e}")
+
+    def range(self, host_key: Tuple[str, int], start: Optional[float] = None,
+              end: Optional[float] = None) -> "np.ndarray":
+        series = self._file(host_key)
+        return series.range(start, end) if series is not None else _empty()
+
+    def latest(self, host_key: Tuple[str, int], n: int) -> "np.ndarray":
+        series = self._file(host_key)
+        return series.latest(n) if series is not None else _empty()
+
+    def close_series(self, host_key: Tuple[str, int]):
+        """Закрытие файла хоста; данные остаются на диске и открываются при следующем обращении."""
+        series = self.files.pop(host_key, None)
+        if series is not None:
+            series.close()
+
+    def close(self):
+        for series in self.files.values():
+            series.close()
+        self.files.clear()
@@ -1,11 +1,37 @@
 import asyncio
 from datetime import datetime, timedelta
 import logging
-import paramiko # type: ignore
-from typing import Dict, Any, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple
 import time
 import json
+import os
 from logger import logger
+import ssh_transport
+
+if TYPE_CHECKING:
+    import paramiko  # type: ignore
+from ssh_transport import ssh_pool
+from timeseries import RESOURCES, MetricsHistory, Sample
+from metrics_store import MetricsStore
+from scheduler import MonitorScheduler
+from outbox import MessageOutbox
+from state_store import ALERTS, MONITORS, StateStore
+from telemetry import METRICS_CACHE_REQUESTS, host_label
+from tracing import span, trace
+from collectors import (
+    LINUX_METRICS_COMMANDS, LINUX_METRICS_SCRIPT, LINUX_METRICS_BASELINE_SCRIPT, WINDOWS_METRICS_COMMAND,
+    cpu_sampler, linux_usage, parse_batch_output, parse_windows_output, windows_usage
+)
+
+# Окно для стрелок тренда в /status и максимальный возраст замера,
+# который еще можно показать без нового обращения к хосту
+STATUS_TREND_WINDOW = int(os.getenv("STATUS_TREND_WINDOW", "900"))
+STATUS_MAX_AGE = int(os.getenv("STATUS_MAX_AGE", "900"))
+# Период, на который распределяются первые проверки после перезапуска
+RESUME_SPREAD = float(os.getenv("MONITOR_RESUME_SPREAD", "60"))
+# Сколько плановых проверок подряд сервер должен отклонить данные SSH
+# подписчика, чтобы мониторинг для него был остановлен
+AUTH_REJECTION_LIMIT = int(os.getenv("MONITOR_AUTH_REJECTION_LIMIT", "3"))
 
 THRESHOLDS = {
     'cpu': 90.0,  # Типизируем как float
@@ -39,82 +65,92 @@ RECOMMENDATIONS = {
     ]
 }
 
-class SSHPool:
-    """Оптимизированный пул SSH-соединений."""
-    def __init__(self, timeout: int = 300):
-        self.connections: Dict[int, paramiko.SSHClient] = {}
-        self.last_used: Dict[int, float] = {}
-        self.timeout = timeout
-        
-    def get_connection(self, user_id: int, ssh_data: dict) -> Tuple[paramiko.SSHClient, bool]:
-        """Получение существующего или создание нового соединения."""
-        current_time = time.time()
-        self._cleanup(current_time)
-        
-        is_new = False
-        if user_id in self.connections:
-            self.last_used[user_id] = current_time
-            try:
-                # Проверяем активность соединения
-                self.connections[user_id].exec_command('echo 1', timeout=2)
-                return self.connections[user_id], is_new
-            except:
-                self.close_connection(user_id)
-        
-        is_new = True
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(
-            hostname=ssh_data['hostname'],
-            username=ssh_data['username'],
-            password=ssh_data['password'],
-            port=ssh_data.get('port', 22),
-            timeout=5,
-            banner_timeout=5
-        )
-        
-        self.connections[user_id] = client
-        self.last_used[user_id] = current_time
-        return client, is_new
-
-    def _cleanup(self, current_time: float):
-        """Очистка неактивных соединений."""
-        for user_id in list(self.connections.keys()):
-            if current_time - self.last_used[user_id] > self.timeout:
-                self.close_connection(user_id)
-                
-    def close_connection(self, user_id: int):
-        """Безопасное закрытие соединения."""
-        if user_id in self.connections:
-            try:
-                self.connections[user_id].close()
-            except Exception as e:
-                logger.error(f"Ошибка закрытия SSH соединения: {e}")
-            finally:
-                del self.connections[user_id]
-                del self.last_used[user_id]
+# Идентификатор хоста: (адрес, порт)
+HostKey = Tuple[str, int]
+
+def is_complete(metrics: Optional[Dict[str, float]]) -> bool:
+    """Содержит ли замер все показатели; при ошибке сбора замер пуст."""
+    return bool(metrics) and all(resource in metrics for resource in RESOURCES)
 
 class MetricsCache:
-    """Кэширование метрик с улучшенной валидацией."""
-    def __init__(self, ttl: int = 30):
-        self.cache: Dict[int, Dict[str, float]] = {}
+    """
+    Кэширование метрик по хостам с улучшенной валидацией.
+
+    Одновременные промахи по одному ключу объединяются: сбор выполняет
+    первый вызов, остальные ждут тот же future. В режиме stale-while-revalidate
+    устаревшее значение (не старше ``stale_ttl``) возвращается сразу,
+    а обновление запускается в фоне.
+    """
+    def __init__(self, ttl: int = 30, stale_ttl: int = 300):
+        self.cache: Dict[HostKey, Dict[str, float]] = {}
         self.ttl = ttl
-        self.last_update: Dict[int, float] = {}
+        self.stale_ttl = stale_ttl
+        self.last_update: Dict[HostKey, float] = {}
+        self._inflight: Dict[HostKey, asyncio.Future] = {}
         
-    def get(self, user_id: int) -> Optional[Dict[str, float]]:
-        if user_id in self.cache and time.time() - self.last_update[user_id] < self.ttl:
-            return self.cache[user_id]
+    def get(self, host_key: HostKey) -> Optional[Dict[str, float]]:
+        if host_key in self.cache and time.time() - self.last_update[host_key] < self.ttl:
+            return self.cache[host_key]
+        return None
+
+    def get_stale(self, host_key: HostKey) -> Optional[Dict[str, float]]:
+        """Значение с истекшим TTL, но не старше stale_ttl."""
+        if host_key in self.cache and time.time() - self.last_update[host_key] < self.stale_ttl:
+            return self.cache[host_key]
         return None
         
-    def set(self, user_id: int, data: Dict[str, float]):
-        self.cache[user_id] = data
-        self.last_update[user_id] = time.time()
+    def set(self, host_key: HostKey, data: Dict[str, float]):
+        self.cache[host_key] = data
+        self.last_update[host_key] = time.time()
         
-    def invalidate(self, user_id: int):
-        """Инвалидация кэша для пользователя."""
-        if user_id in self.cache:
-            del self.cache[user_id]
-            del self.last_update[user_id]
+    def invalidate(self, host_key: HostKey):
+        """Инвалидация кэша для хоста."""
+        if host_key in self.cache:
+            del self.cache[host_key]
+            del self.last_update[host_key]
+
+    def _start_fetch(self, host_key: HostKey,
+                     fetch: Callable[[], Awaitable[Dict[str, float]]]) -> asyncio.Future:
+        future = self._inflight.get(host_key)
+        if future is not None:
+            return future
+
+        async def run() -> Dict[str, float]:
+            try:
+                data = await fetch()
+                if is_complete(data):
+                    self.set(host_key, data)
+                else:
+                    self.invalidate(host_key)
+                return data
+            finally:
+                self._inflight.pop(host_key, None)
+
+        future = self._inflight[host_key] = asyncio.ensure_future(run())
+        return future
+
+    async def get_or_fetch(self, host_key: HostKey, fetch: Callable[[], Awaitable[Dict[str, float]]],
+                           stale_ok: bool = False) -> Dict[str, float]:
+        """
+        Значение из кэша или результат единственного на ключ вызова ``fetch``.
+
+        Args:
+            fetch: Корутина-фабрика, выполняющая сбор метрик
+            stale_ok: Вернуть устаревшее значение сразу и обновить его в фоне
+        """
+        cached = self.get(host_key)
+        if cached:
+            METRICS_CACHE_REQUESTS.inc('hit')
+            return cached
+        if stale_ok:
+            stale = self.get_stale(host_key)
+            if stale:
+                METRICS_CACHE_REQUESTS.inc('stale')
+                self._start_fetch(host_key, fetch)
+                return stale
+        METRICS_CACHE_REQUESTS.inc('coalesced' if host_key in self._inflight else 'miss')
+        # shield: отмена одного ожидающего не прерывает сбор для остальных
+        return await asyncio.shield(self._start_fetch(host_key, fetch))
 
 def format_size(size: float, unit: str) -> str:
     if unit.upper() == 'MB':
@@ -129,19 +165,28 @@ def format_size(size: float, unit: str) -> str:
 
 class SystemMonitor:
     """Оптимизированный монитор системы."""
-    def __init__(self, bot):
+    def __init__(self, bot, state: Optional[StateStore] = None, outbox: Optional[MessageOutbox] = None):
         """
         Инициализация системы мониторинга с адаптивным интервалом проверки.
         
         Args:
             bot: Объект бота для отправки уведомлений
+            state: Хранилище состояния для восстановления после перезапуска
+            outbox: Очередь исходящих уведомлений; по умолчанию создается своя
         """
         self.bot = bot
+        self.outbox = outbox or MessageOutbox(bot)
         self.base_interval = 300  # базовый интервал 5 минут
         self.min_interval = 60    # минимальный интервал 1 минута
-        self.monitoring_tasks = {}
+        self.monitored: Dict[int, HostKey] = {}  # хост, за которым следит пользователь
+        # Подписчики каждого хоста: user_id -> параметры SSH. Сбор метрик
+        # выполняется один раз на хост и рассылается всем подписчикам
+        self.subscribers: Dict[HostKey, Dict[int, dict]] = {}
+        # Отказы в авторизации подряд для данных SSH подписчика
+        self.auth_rejections: Dict[int, int] = {}
+        self.scheduler = MonitorScheduler(self._scheduled_check)
         self.logger = logger
-        self.ssh_pool = SSHPool()
+        self.ssh_pool = ssh_pool
         self.metrics_cache = MetricsCache()
         self.alert_states = {}
         self.last_alert_time = {}
@@ -149,33 +194,17 @@ class SystemMonitor:
         self.last_metrics = {}
         self.false_positive_threshold = 3
         self.high_load_counter = {}
-        self.current_intervals = {}  # хранение текущих интервалов для каждого пользователя
-
-        self.linux_commands = {
-            'cpu': "top -bn1 | grep 'Cpu(s)' | awk '{print $2}'",
-            'ram': "free | awk '/Mem:/ {print ($3/$2)*100}'",
-            'disk': "df -P / | awk 'NR==2 {print $5}' | tr -d '%'"
-        }
-
-        self.windows_commands = {
-            'cpu': 'powershell -command "$loadAvg=(Get-CimInstance Win32_Processor).LoadPercentage;Write-Output $loadAvg"',
-            'ram': 'powershell -command "$os=Get-CimInstance Win32_OperatingSystem;Write-Output ([math]::Round(100-($os.FreePhysicalMemory/$os.TotalVisibleMemorySize*100)))"',
-            'disk': 'powershell -command "$disk=Get-PSDrive C;Write-Output ([math]::Round(100-($disk.Free/($disk.Used+$disk.Free)*100)))"'
-        }
-
-        # Оптимизированные команды для Linux с использованием /proc и минимальной нагрузкой
-        self.linux_commands = {
-            'cpu': "top -bn1 | grep 'Cpu(s)' | awk '{print $2}'",  # Используем loadavg вместо текущей загрузки
-            'ram': "free | awk '/Mem:/ {print ($3/$2)*100}'",  # Формула для процента использованной памяти
-            'disk': "df -P / | awk 'NR==2 {print $5}' | tr -д '%'"
-        }
-        
-        # Оптимизированные команды для Windows
-        self.windows_commands = {
-            'cpu': 'powershell "$loadAvg=(Get-CimInstance Win32_Processor).LoadPercentage;Write-Output $loadAvg"',
-            'ram': 'powershell "$os=Get-CimInstance Win32_OperatingSystem;Write-Output ([math]::Round(($os.TotalVisibleMemorySize-$os.FreePhysicalMemory)/$os.TotalVisibleMemorySize*100,1))"',
-            'disk': 'powershell "$disk=Get-PSDrive C;Write-Output ([math]::Round($disk.Used/($disk.Used+$disk.Free)*100,1))"'
-        }
+        self.current_intervals = {}  # текущий интервал проверки для каждого хоста
+        self.cpu_sampler = cpu_sampler  # счетчики /proc/stat по хостам
+        self.history = MetricsHistory()  # история замеров по хостам
+        self.store = MetricsStore()  # история на диске, переживает перезапуск
+        self.state = state
+        if state is not None:
+            # Кулдауны уведомлений переживают перезапуск, иначе после
+            # каждого деплоя пользователи получают повторные алерты
+            for user_id, saved in state.load(ALERTS).items():
+                self.alert_states[user_id] = saved.get('states', {})
+                self.last_alert_time[user_id] = saved.get('last', {})
 
     def _calculate_check_interval(self, metrics):
         """
@@ -184,9 +213,9 @@ class SystemMonitor:
         """
         try:
             # Получаем значения метрик
-            cpu = float(metrics.get('Загрузка процессора', 0))
-            ram = float(metrics.get('Использование ОЗУ', 0))
-            disk = float(metrics.get('Использование диска', 0))
+            cpu = float(metrics.get('cpu', 0))
+            ram = float(metrics.get('ram', 0))
+            disk = float(metrics.get('disk', 0))
             
             # Находим максимальную нагрузку среди всех ресурсов
             max_usage = max(cpu, ram, disk)
@@ -205,120 +234,318 @@ class SystemMonitor:
             return self.base_interval
 
     async def start_monitoring(self, user_id, ssh_data):
-        if user_id in self.monitoring_tasks:
+        if user_id in self.monitored:
             return False
+
+        host_key = self._host_key(ssh_data)
+        if host_key in self.subscribers:
+            # Хост уже проверяется для других пользователей: достаточно подписки
+            self._subscribe(user_id, host_key, ssh_data)
+            self.logger.info(f"Пользователь {user_id} подписан на мониторинг {host_key[0]}")
+            return True
         
         try:
-            metrics = await self._get_metrics(user_id, ssh_data)
-            if not metrics:
+            metrics = await self._get_metrics(host_key, ssh_data)
+            if not is_complete(metrics):
                 return False
         except Exception as e:
             self.logger.error(f"Ошибка при старте мониторинга: {e}")
             return False
-            
-        task = asyncio.create_task(self._monitor_loop(user_id, ssh_data))
-        self.monitoring_tasks[user_id] = task
+
+        # За время сбора хост мог быть добавлен другим пользователем
+        first = host_key not in self.subscribers
+        self._subscribe(user_id, host_key, ssh_data)
+        if first:
+            self._record_sample(host_key, time.time(), metrics)
+            check_interval = self._calculate_check_interval(metrics)
+            self.current_intervals[host_key] = check_interval
+            self.scheduler.add(host_key, check_interval, spread=False)
         self.logger.info(f"Запущен мониторинг для пользователя {user_id}")
+        try:
+            await self._check_thresholds(user_id, metrics)
+        except Exception as e:
+            self.logger.error(f"Ошибка при проверке порогов: {e}")
         return True
 
     async def stop_monitoring(self, user_id):
-        if user_id in self.monitoring_tasks:
-            self.monitoring_tasks[user_id].cancel()
-            del self.monitoring_tasks[user_id]
-            if user_id in self.alert_states:
-                del self.alert_states[user_id]
+        if user_id in self.monitored:
+            self._unsubscribe(user_id)
             self.logger.info(f"Остановлен мониторинг для пользователя {user_id}")
             return True
         return False
 
+    def resume(self, spread: float = RESUME_SPREAD) -> int:
+        """
+        Восстановление мониторинга, сохраненного до перезапуска.
+
+        Первые проверки хостов распределяются случайно на ``spread`` секунд,
+        чтобы переподключения не выполнялись одновременно.
+
+        Returns:
+            Число восстановленных подписок
+        """
+        if self.state is None:
+            return 0
+        resumed = 0
+        for user_id, ssh_data in self.state.load(MONITORS).items():
+            if user_id in self.monitored:
+                continue
+            host_key = self._host_key(ssh_data)
+            first = host_key not in self.subscribers
+            self._subscribe(user_id, host_key, ssh_data)
+            if first:
+                self.scheduler.add(host_key, spread, spread=True)
+            resumed += 1
+        if resumed:
+            self.logger.info(f"Восстановлен мониторинг для {resumed} пользователей")
+        return resumed
+
+    def _subscribe(self, user_id, host_key: HostKey, ssh_data: dict):
+        self.subscribers.setdefault(host_key, {})[user_id] = ssh_data
+        self.monitored[user_id] = host_key
+        self.auth_rejections.pop(user_id, None)
+        if self.state is not None:
+            self.state.save(MONITORS, user_id, ssh_data)
+
+    def _unsubscribe(self, user_id):
+        """Отписка пользователя; хост без подписчиков снимается с проверки."""
+        host_key = self.monitored.pop(user_id, None)
+        self.auth_rejections.pop(user_id, None)
+        self.alert_states.pop(user_id, None)
+        self.last_alert_time.pop(user_id, None)
+        if self.state is not None:
+            self.state.save(MONITORS, user_id, None)
+            self.state.save(ALERTS, user_id, None)
+        subscribers = self.subscribers.get(host_key)
+        if subscribers is None:
+            return
+        subscribers.pop(user_id, None)
+        if not subscribers:
+            del self.subscribers[host_key]
+            self.scheduler.remove(host_key)
+            self.current_intervals.pop(host_key, None)
+            # История хоста больше не пополняется: освобождаются буфер и mmap
+            self.history.drop(host_key)
+            self.store.close_series(host_key)
+
     def is_monitoring(self, user_id):
-        return user_id in self.monitoring_tasks
+        return user_id in self.monitored
+
+    async def shutdown(self):
+        """Остановка планировщика проверок, отправка оставшихся уведомлений и закрытие хранилища."""
+        await self.scheduler.shutdown()
+        await self.outbox.close()
+        self.store.close()
 
-    async def _monitor_loop(self, user_id, ssh_data):
+    @staticmethod
+    def _host_key(ssh_data: dict) -> HostKey:
+        return ssh_data['hostname'], ssh_data.get('port', 22)
+
+    def _record_sample(self, host_key: Tuple[str, int], timestamp: float, metrics: Dict[str, float]):
+        """Сохранение замера в памяти и на диске. Неполные замеры не сохраняются."""
+        if not is_complete(metrics):
+            return
+        if self.history.get(host_key) is None:
+            # После перезапуска восполняем буфер из файла на диске
+            for record in self.store.latest(host_key, self.history.capacity):
+                self.history.record(host_key, float(record['timestamp']), {
+                    'cpu': float(record['cpu']),
+                    'ram': float(record['ram']),
+                    'disk': float(record['disk'])
+                })
+        self.history.record(host_key, timestamp, metrics)
         try:
-            while True:
-                try:
-                    metrics = await self._get_metrics(user_id, ssh_data)
-                    await self._check_thresholds(user_id, metrics)
-                    
-                    # Рассчитываем новый интервал на основе метрик
-                    check_interval = self._calculate_check_interval(metrics)
-                    self.current_intervals[user_id] = check_interval
-                    
-                except Exception as e:
-                    self.logger.error(f"Ошибка в цикле мониторинга: {e}")
-                    await self.bot.send_message(
-                        user_id,
-                        "❌ Ошибка при получении данных мониторинга. Мониторинг остановлен."
+            self.store.append(host_key, timestamp, metrics)
+        except OSError as e:
+            self.logger.error(f"Ошибка записи метрик на диск: {e}")
+
+    def get_status(self, ssh_data: dict) -> Optional[Tuple[Sample, Optional[Sample]]]:
+        """
+        Последний замер хоста из истории мониторинга без обращения по SSH.
+
+        Returns:
+            Кортеж (последний замер, замер для сравнения из окна
+            STATUS_TREND_WINDOW или None) либо None, если свежих замеров нет
+        """
+        ring = self.history.get(self._host_key(ssh_data))
+        if ring is None or not len(ring):
+            return None
+        latest = ring.latest(1)[0]
+        if time.time() - latest.timestamp > STATUS_MAX_AGE:
+            return None
+        window = ring.range(latest.timestamp - STATUS_TREND_WINDOW, latest.timestamp)
+        reference = window[0] if len(window) > 1 else None
+        return latest, reference
+
+    async def sample_now(self, user_id: int, ssh_data: dict) -> Optional[Sample]:
+        """Разовый замер хоста, который не находится под мониторингом."""
+        host_key = self._host_key(ssh_data)
+        # Для разового ответа допустимо недавнее значение с фоновым обновлением
+        metrics = await self._get_metrics(host_key, ssh_data, stale_ok=True)
+        if not is_complete(metrics):
+            # Сбор не удался: нулевые значения выглядели бы как реальный замер
+            return None
+        timestamp = self.metrics_cache.last_update.get(host_key, time.time())
+        return Sample(timestamp, metrics['cpu'], metrics['ram'], metrics['disk'])
+
+    async def _scheduled_check(self, host_key: HostKey) -> Optional[float]:
+        """
+        Одна плановая проверка хоста с рассылкой результата подписчикам.
+
+        Returns:
+            Интервал до следующей проверки или None, если подписчиков не осталось
+        """
+        subscribers = self.subscribers.get(host_key)
+        if not subscribers:
+            return None
+        try:
+            with trace('monitor', host=host_label(*host_key), subscribers=len(subscribers)):
+                with span('monitor.metrics'):
+                    metrics = await self.metrics_cache.get_or_fetch(
+                        host_key, lambda: self._fetch_subscribed_metrics(host_key)
                     )
-                    break
+                if host_key not in self.subscribers:
+                    # Данные всех подписчиков перестали подходить
+                    return None
+                if metrics:
+                    with span('monitor.record'):
+                        self._record_sample(host_key, time.time(), metrics)
+                with span('monitor.alerts'):
+                    for user_id in list(subscribers):
+                        await self._check_thresholds(user_id, metrics)
+
+            # Рассчитываем новый интервал на основе метрик
+            check_interval = self._calculate_check_interval(metrics)
+            self.current_intervals[host_key] = check_interval
+            return check_interval
 
-                await asyncio.sleep(check_interval)
+        except Exception as e:
+            self.logger.error(f"Ошибка в цикле мониторинга: {e}")
+            for user_id in list(subscribers):
+                self._unsubscribe(user_id)
+                self.outbox.send(
+                    user_id,
+                    "❌ Ошибка при получении данных мониторинга. Мониторинг остановлен."
+                )
+            return None
 
-        except asyncio.CancelledError:
-            self.logger.info(f"Мониторинг отменен для пользователя {user_id}")
-        finally:
-            self.ssh_pool.close_connection(user_id)
-            if user_id in self.monitoring_tasks:
-                del self.monitoring_tasks[user_id]
-            if user_id in self.current_intervals:
-                del self.current_intervals[user_id]
+    async def _get_metrics(self, host_key: HostKey, ssh_data: dict,
+                           stale_ok: bool = False) -> Dict[str, float]:
+        """Получение метрик хоста с кэшированием и объединением одновременных запросов."""
+        return await self.metrics_cache.get_or_fetch(
+            host_key, lambda: self._fetch_metrics(ssh_data), stale_ok=stale_ok
+        )
 
-    async def _get_metrics(self, user_id: int, ssh_data: dict) -> Dict[str, float]:
-        """Получение метрик с оптимизированным кэшированием."""
+    async def _fetch_subscribed_metrics(self, host_key: HostKey) -> Dict[str, float]:
+        """
+        Сбор метрик хоста под мониторингом.
+
+        За проверку выполняется не больше одного подключения, чтобы серия
+        неудачных входов не привела к блокировке бота на хосте (fail2ban,
+        MaxAuthTries). Используются данные самого раннего подписчика,
+        которые сервер еще не отклонял. Если сервер отклонил данные
+        AUTH_REJECTION_LIMIT проверок подряд (например, сменился пароль),
+        подписчики с этими данными отключаются от мониторинга с уведомлением.
+        """
+        subscribers = self.subscribers.get(host_key)
+        if not subscribers:
+            return {}
+        # Данные с меньшим числом отказов пробуются первыми
+        user_id, ssh_data = min(subscribers.items(),
+                                key=lambda item: self.auth_rejections.get(item[0], 0))
         try:
-            cached_data = self.metrics_cache.get(user_id)
-            if cached_data:
-                return cached_data
+            metrics = await self._fetch_metrics(ssh_data, raise_auth_errors=True)
+        except Exception as e:
+            self._reject_credentials(host_key, self.ssh_pool.make_key(ssh_data), e)
+            return {}
+        self.auth_rejections.pop(user_id, None)
+        return metrics
 
-            client, is_new = self.ssh_pool.get_connection(user_id, ssh_data)
-            
-            try:
-                # Определяем ОС только для новых соединений
-                if is_new:
-                    os_type = await self._detect_os_type(client)
-                    ssh_data['os_type'] = os_type
-                
-                metrics = await self._collect_metrics(client, ssh_data.get('os_type', 'linux'))
-                self.metrics_cache.set(user_id, metrics)
-                return metrics
-                
-            except Exception as e:
-                logger.error(f"Ошибка сбора метрик: {e}")
-                self.metrics_cache.invalidate(user_id)
-                return {}
+    def _reject_credentials(self, host_key: HostKey, pool_key: tuple, error: Exception):
+        """Учет отказа в авторизации для всех подписчиков с теми же данными SSH."""
+        for user_id, ssh_data in list(self.subscribers.get(host_key, {}).items()):
+            if self.ssh_pool.make_key(ssh_data) != pool_key:
+                continue
+            rejections = self.auth_rejections[user_id] = self.auth_rejections.get(user_id, 0) + 1
+            self.logger.warning(
+                f"Данные SSH пользователя {user_id} для {host_key[0]} отклонены "
+                f"({rejections}/{AUTH_REJECTION_LIMIT}): {error}"
+            )
+            if rejections >= AUTH_REJECTION_LIMIT:
+                self._unsubscribe(user_id)
+                self.outbox.send(
+                    user_id,
+                    f"❌ Не удалось подключиться к {host_key[0]}: данные SSH больше не подходят. "
+                    "Мониторинг остановлен, обновите подключение через /ssh."
+                )
+
+    async def _fetch_metrics(self, ssh_data: dict, raise_auth_errors: bool = False) -> Dict[str, float]:
+        """
+        Сбор метрик хоста по SSH.
+
+        Args:
+            raise_auth_errors: Пробросить ошибку, если сервер отклонил
+                учетные данные, вместо пустого результата
+        """
+        try:
+            async with self.ssh_pool.lease(ssh_data) as conn:
+                try:
+                    # Тип ОС определяется один раз на сессию и общий с /log
+                    if conn.os_type is None:
+                        with span('os.detect'):
+                            conn.os_type = await self._detect_os_type(conn.client)
+
+                    return await self._collect_metrics(conn.client, conn.os_type, conn.host_key)
+
+                except Exception as e:
+                    logger.error(f"Ошибка сбора метрик: {e}")
+                    return {}
                 
         except Exception as e:
+            if raise_auth_errors and ssh_transport.is_auth_error(e):
+                raise
             logger.error(f"Ошибка подключения: {e}")
             return {}
 
-    async def _detect_os_type(self, client: paramiko.SSHClient) -> str:
+    async def _detect_os_type(self, client: "paramiko.SSHClient") -> str:
         """Определение типа ОС с кэшированием результата."""
         try:
-            _, stdout, _ = client.exec_command('ver', timeout=5)
-            return 'windows' if 'windows' in stdout.read().decode().lower() else 'linux'
+            output, _ = await ssh_transport.exec_command(client, 'ver', timeout=5)
+            return 'windows' if 'windows' in output.lower() else 'linux'
         except:
             return 'linux'
 
-    async def _collect_metrics(self, client: paramiko.SSHClient, os_type: str) -> Dict[str, float]:
+    async def _collect_metrics(self, client: "paramiko.SSHClient", os_type: str,
+                               host_key=None) -> Dict[str, float]:
         """Сбор метрик с валидацией значений."""
-        commands = self.windows_commands if os_type == 'windows' else self.linux_commands
-        metrics = {}
+        if os_type == 'windows':
+            return await self._collect_windows_metrics(client)
 
-        for resource, command in commands.items():
-            try:
-                _, stdout, _ = client.exec_command(command, timeout=5)
-                output = stdout.read().decode().strip()
-                # Убираем символ % если он есть
-                if '%' in output:
-                    output = output.replace('%', '')
-                value = float(output)
-                metrics[resource] = max(0.0, min(100.0, value))  # Нормализация значений
-            except Exception as e:
-                logger.error(f"Ошибка сбора метрики {resource}: {e}")
-                metrics[resource] = 0.0
+        try:
+            script = (LINUX_METRICS_SCRIPT if self.cpu_sampler.has_baseline(host_key)
+                      else LINUX_METRICS_BASELINE_SCRIPT)
+            output, _ = await ssh_transport.exec_command(client, script, timeout=5)
+            data = parse_batch_output(output, LINUX_METRICS_COMMANDS)
+            if data is None:
+                raise ValueError("некорректный вывод скрипта метрик")
+            usage = linux_usage(self.cpu_sampler, host_key, data)
+            return {resource: max(0.0, min(100.0, value)) for resource, value in usage.items()}
+        except Exception as e:
+            logger.error(f"Ошибка сбора метрик Linux: {e}")
+            return {}
 
-        return metrics
+    async def _collect_windows_metrics(self, client: "paramiko.SSHClient") -> Dict[str, float]:
+        """Сбор метрик Windows одним запуском PowerShell."""
+        try:
+            output, _ = await ssh_transport.exec_command(client, WINDOWS_METRICS_COMMAND, timeout=30)
+            data = parse_windows_output(output)
+            if data is None:
+                raise ValueError("некорректный вывод PowerShell")
+            usage = windows_usage(data)
+            return {resource: max(0.0, min(100.0, value)) for resource, value in usage.items()}
+        except Exception as e:
+            logger.error(f"Ошибка сбора метрик Windows: {e}")
+            return {}
 
     async def _check_thresholds(self, user_id: int, metrics: Dict[str, float]):
         """Проверка пороговых значений с защитой от ложных срабатываний."""
@@ -330,6 +557,7 @@ class SystemMonitor:
 
         alerts = []
         resolved = []
+        changed = False
 
         for resource, current_value in metrics.items():
             if resource not in THRESHOLDS:
@@ -346,22 +574,30 @@ class SystemMonitor:
             elif prev_state:
                 resolved.append((resource, current_value))
 
+            if prev_state != (current_value >= threshold):
+                changed = True
             self.alert_states.setdefault(user_id, {})[resource] = current_value >= threshold
 
+        if (changed or alerts) and self.state is not None:
+            self.state.save(ALERTS, user_id, {
+                'states': self.alert_states.get(user_id, {}),
+                'last': self.last_alert_time.get(user_id, {})
+            })
+
         if alerts:
             message = "⚠️ *Критическая нагрузка:*\n\n"
             for resource, value, threshold in alerts:
                 message += f"{LOG_MESSAGES['high_load'].format(resource=resource, value=value, threshold=threshold)}\n"
                 message += "*Рекомендации:*\n" + "\n".join(RECOMMENDATIONS[resource]) + "\n\n"
-            
-            await self.bot.send_message(user_id, message, parse_mode="Markdown")
+
+            self.outbox.send(user_id, message, parse_mode="Markdown")
 
         if resolved:
             message = "✅ *Нагрузка нормализовалась:*\n"
             for resource, value in resolved:
                 message += LOG_MESSAGES['load_normalized'].format(resource=resource, value=value) + "\n"
-            
-            await self.bot.send_message(user_id, message, parse_mode="Markdown")
+
+            self.outbox.send(user_id, message, parse_mode="Markdown")
 
     async def _check_metrics(self, user_id, system_data):
         alerts = []
@@ -387,11 +623,7 @@ class SystemMonitor:
                         message += f"{rec}\n"
                     message += "\n"
 
-                await self.bot.send_message(
-                    user_id,
-                    message,
-                    parse_mode="Markdown"
-                )
+                self.outbox.send(user_id, message, parse_mode="Markdown")
 
         except Exception as e:
             self.logger.error(f"Ошибка при проверке метрик: {e}")
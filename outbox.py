@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from aiogram.utils.exceptions import BadRequest, RetryAfter, Unauthorized  # type: ignore
+from logger import logger
+
+# Лимиты Telegram: около 30 сообщений в секунду всего и 1 в секунду в один чат
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+# Сколько секунд копить уведомления для чата перед отправкой одним сообщением
+OUTBOX_COALESCE_WINDOW = float(os.getenv("OUTBOX_COALESCE_WINDOW", "1"))
+# Попыток отправки при сетевых ошибках
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "3"))
+
+MAX_MESSAGE_LENGTH = 4096
+
+class TokenBucket:
+    """Корзина токенов: ``rate`` токенов в секунду, не больше ``capacity`` в запасе."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+@dataclass
+class _Message:
+    text: str
+    parse_mode: Optional[str]
+    coalesce: bool
+    attempts: int = 0
+    kwargs: dict = field(default_factory=dict)
+
+class MessageOutbox:
+    """
+    Очередь исходящих сообщений бота.
+
+    Отправка ограничена корзинами токенов (общей и для каждого чата).
+    Уведомления одному чату, накопившиеся за ``coalesce_window`` секунд
+    или пока чат ждет своей очереди, объединяются в одно сообщение.
+    На RetryAfter чат приостанавливается на указанное время и сообщение
+    отправляется повторно; ошибки отправки не доходят до вызывающего.
+    """
+    def __init__(self, bot, global_rate: float = OUTBOX_GLOBAL_RATE,
+                 chat_rate: float = OUTBOX_CHAT_RATE,
+                 coalesce_window: float = OUTBOX_COALESCE_WINDOW,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max(1, max_attempts)
+        # Запас в один токен: отправки идут равномерно и не превышают
+        # лимит ни в одном секундном окне
+        self._global = TokenBucket(global_rate, 1)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._pending: Dict[int, Deque[_Message]] = {}
+        self._paused_until: Dict[int, float] = {}
+        self._inflight: Set[int] = set()
+        # (срок, номер, чат) с ленивым удалением, как в MonitorScheduler
+        self._heap: List[Tuple[float, int, int]] = []
+        self._entries: Dict[int, int] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._pending.values())
+
+    def send(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+             coalesce: bool = True, **kwargs):
+        """
+        Постановка сообщения в очередь.
+
+        Args:
+            coalesce: Разрешить объединение с соседними сообщениями этому чату.
+                Сообщения с дополнительными параметрами (клавиатурой и т.п.)
+                не объединяются
+        """
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        queue = self._pending.setdefault(chat_id, deque())
+        queue.append(_Message(text, parse_mode, coalesce and not kwargs, kwargs=kwargs))
+        if chat_id not in self._entries and chat_id not in self._inflight:
+            delay = self.coalesce_window if queue[0].coalesce else 0.0
+            self._schedule(chat_id, time.monotonic() + delay)
+
+    def _schedule(self, chat_id: int, when: float):
+        seq = next(self._counter)
+        self._entries[chat_id] = seq
+        heapq.heappush(self._heap, (when, seq, chat_id))
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    def _take_batch(self, chat_id: int) -> List[_Message]:
+        """Первое сообщение очереди и следующие за ним, которые можно к нему присоединить."""
+        queue = self._pending[chat_id]
+        batch = [queue.popleft()]
+        if batch[0].coalesce:
+            length = len(batch[0].text)
+            while queue and queue[0].coalesce and queue[0].parse_mode == batch[0].parse_mode:
+                length += len(queue[0].text) + 2
+                if length > MAX_MESSAGE_LENGTH:
+                    break
+                batch.append(queue.popleft())
+        if not queue:
+            del self._pending[chat_id]
+        return batch
+
+    async def _dispatch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, chat_id = heapq.heappop(self._heap)
+                if self._entries.get(chat_id) != seq:
+                    continue
+                del self._entries[chat_id]
+                if chat_id not in self._pending:
+                    continue
+                bucket = self._chat_bucket(chat_id)
+                wait = max(self._global.delay(now), bucket.delay(now),
+                           self._paused_until.get(chat_id, 0) - now)
+                if wait > 0:
+                    self._schedule(chat_id, now + wait)
+                    continue
+                self._global.take(now)
+                bucket.take(now)
+                self._paused_until.pop(chat_id, None)
+                self._inflight.add(chat_id)
+                task = asyncio.create_task(self._deliver(chat_id, self._take_batch(chat_id)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            # Ожидание ближайшего срока или нового сообщения, как в MonitorScheduler
+            timer = None
+            if self._heap:
+                timer = loop.call_later(max(0.0, self._heap[0][0] - now), self._wakeup.set)
+            try:
+                await self._wakeup.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    def _requeue(self, chat_id: int, batch: List[_Message]):
+        queue = self._pending.setdefault(chat_id, deque())
+        queue.extendleft(reversed(batch))
+
+    async def _deliver(self, chat_id: int, batch: List[_Message]):
+        first = batch[0]
+        text = "\n\n".join(message.text.strip() for message in batch) if len(batch) > 1 else first.text
+        retry_at = 0.0
+        try:
+            await self.bot.send_message(chat_id, text, parse_mode=first.parse_mode, **first.kwargs)
+        except RetryAfter as e:
+            logger.warning(f"Telegram RetryAfter для чата {chat_id}: {e.timeout} с")
+            retry_at = time.monotonic() + e.timeout
+            self._paused_until[chat_id] = retry_at
+            self._requeue(chat_id, batch)
+        except (Unauthorized, BadRequest) as e:
+            logger.error(f"Сообщение в чат {chat_id} отброшено: {e}")
+        except Exception as e:
+            first.attempts += 1
+            if first.attempts < self.max_attempts:
+                logger.warning(f"Ошибка отправки в чат {chat_id}, попытка {first.attempts}: {e}")
+                retry_at = time.monotonic() + 2 ** first.attempts
+                self._paused_until[chat_id] = retry_at
+                self._requeue(chat_id, batch)
+            else:
+                logger.error(f"Сообщение в чат {chat_id} не отправлено после {first.attempts} попыток: {e}")
+        finally:
+            self._inflight.discard(chat_id)
+            if chat_id in self._pending:
+                self._schedule(chat_id, max(time.monotonic(), retry_at))
+
+    async def close(self, timeout: float = 5):
+        """Отправка оставшихся сообщений (не дольше ``timeout`` секунд) и остановка."""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._tasks) and time.monotonic() < deadline:
+            if self._pending and (self._dispatcher is None or self._dispatcher.done()):
+                break
+            await asyncio.sleep(0.05)
+        if self._pending:
+            logger.warning(f"При остановке не отправлено сообщений: {self.pending}")
+        tasks = list(self._tasks)
+        if self._dispatcher is not None:
+            tasks.append(self._dispatcher)
+            self._dispatcher = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,272 @@
+import os
+import time
+from typing import Optional
+from datetime import datetime, timezone, timedelta
+from io import BytesIO
+from reportlab.lib.pagesizes import letter  # type: ignore
+from reportlab.lib import colors  # type: ignore
+from reportlab.lib.units import inch  # type: ignore
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle  # type: ignore
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle  # type: ignore
+from reportlab.lib.enums import TA_CENTER, TA_LEFT  # type: ignore
+from reportlab.pdfbase import pdfmetrics  # type: ignore
+from reportlab.pdfbase.ttfonts import TTFont  # type: ignore
+from logger import logger
+from tracing import span
+from charts import resource_pies, trend_chart
+from metrics_store import METRICS_STORAGE_PATH, MetricsStore
+from timeseries import RESOURCES, minmax_downsample
+
+# Константы и настройки
+FONTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+DEFAULT_FONT = 'DejaVuSans'
+TREND_MAX_POINTS = 500  # предел точек на линию графика динамики
+# Периоды графиков динамики: (заголовок, длительность, единица оси X, подпись оси)
+TREND_PERIODS = [
+    ('Последний час', 3600, 60, 'минут назад'),
+    ('Последние 24 часа', 86400, 3600, 'часов назад'),
+    ('Последние 7 дней', 7 * 86400, 86400, 'дней назад')
+]
+
+def register_fonts():
+    """Регистрация шрифтов с обработкой ошибок."""
+    try:
+        font_path = os.path.join(FONTS_PATH, "DejaVuSans.ttf")
+        if os.path.exists(font_path):
+            pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
+            logger.info("Шрифт DejaVuSans успешно зарегистрирован")
+            return True
+        logger.error("Файл шрифта не найден")
+        return False
+    except Exception as e:
+        logger.error(f"Ошибка регистрации шрифта: {e}")
+        return False
+
+def add_resource_charts(elements: list, system_data: dict):
+    """Создание графиков использования ресурсов."""
+    try:
+        # Извлекаем и нормализуем значения из system_data
+        def extract_value(value_str):
+            try:
+                if isinstance(value_str, (int, float)):
+                    return float(value_str)
+                if isinstance(value_str, str):
+                    # Извлекаем первое число из строки
+                    import re
+                    numbers = re.findall(r'[\d.]+', value_str)
+                    return float(numbers[0]) if numbers else 0.0
+                return 0.0
+            except (ValueError, IndexError):
+                return 0.0
+
+        resources = [
+            ('Загрузка процессора', extract_value(system_data.get('Загрузка процессора'))),
+            ('Использование ОЗУ', extract_value(system_data.get('Использование ОЗУ'))),
+            ('Использование диска', extract_value(system_data.get('Использование диска')))
+        ]
+
+        elements.append(resource_pies(resources, DEFAULT_FONT))
+        elements.append(Spacer(1, 0.2*inch))
+        
+    except Exception as e:
+        logger.error(f"Ошибка создания графиков: {e}")
+        elements.append(Paragraph(
+            "Не удалось создать графики использования ресурсов", 
+            ParagraphStyle('Error', fontName=DEFAULT_FONT, fontSize=12, textColor=colors.red)
+        ))
+
+def collect_report_history(store: MetricsStore, host_key) -> dict:
+    """
+    Выборка истории замеров хоста для графиков отчета.
+
+    Returns:
+        Словарь ``{название периода: (timestamps, {ресурс: значения})}``
+        с прореженными рядами; периоды без данных пропускаются
+    """
+    history = {}
+    now = time.time()
+    for title, seconds, _, _ in TREND_PERIODS:
+        records = store.range(host_key, now - seconds, now)
+        if len(records) < 2:
+            continue
+        series = {}
+        for resource in RESOURCES:
+            series[resource] = minmax_downsample(records['timestamp'], records[resource], TREND_MAX_POINTS)
+        history[title] = (now, series)
+    return history
+
+def add_trend_charts(elements: list, history: dict):
+    """Создание графиков динамики нагрузки за несколько периодов."""
+    if not history:
+        elements.append(Paragraph(
+            "Нет данных мониторинга для построения графиков динамики",
+            ParagraphStyle('Info', fontName=DEFAULT_FONT, fontSize=12)
+        ))
+        return
+
+    try:
+        for title, _, unit, unit_name in TREND_PERIODS:
+            if title not in history:
+                continue
+            now, series = history[title]
+
+            elements.append(trend_chart(title, now, series, unit, unit_name, DEFAULT_FONT))
+            elements.append(Spacer(1, 0.1*inch))
+    except Exception as e:
+        logger.error(f"Ошибка создания графиков динамики: {e}")
+        elements.append(Paragraph(
+            "Не удалось создать графики динамики нагрузки",
+            ParagraphStyle('Error', fontName=DEFAULT_FONT, fontSize=12, textColor=colors.red)
+        ))
+
+def generate_system_report_pdf(system_data=None, history=None):
+    """
+    Генерирует PDF-отчет о состоянии системы.
+    
+    Создает структурированный отчет, включающий:
+    - Основную информацию о системе
+    - Графики использования ресурсов
+    - Графики динамики нагрузки по данным мониторинга
+    - Подробные метрики работы
+    
+    Args:
+        system_data: Словарь с данными о системе
+        history: Прореженная история замеров (см. collect_report_history)
+        
+    Returns:
+        bytes: Содержимое PDF-файла или None при ошибке
+    """
+    try:
+        moscow_tz = timezone(timedelta(hours=3))
+        now = datetime.now(moscow_tz)
+        months_ru = {
+            1: "января", 2: "февраля", 3: "марта", 4: "апреля",
+            5: "мая", 6: "июня", 7: "июля", 8: "августа",
+            9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
+        }
+        current_date = f"{now.day} {months_ru[now.month]} {now.year} года"
+        
+        logger.info("Начало генерации PDF-файла.")
+        
+        buf = BytesIO()
+        doc = SimpleDocTemplate(buf, pagesize=letter, encoding='utf-8')
+        elements = []
+        
+        logger.info(f"Используем шрифт: {DEFAULT_FONT}")
+        
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            fontName=DEFAULT_FONT,
+            fontSize=18,
+            alignment=TA_CENTER,
+            leading=22
+        )
+        heading_style = ParagraphStyle(
+            'CustomHeading',
+            fontName=DEFAULT_FONT,
+            fontSize=14,
+            alignment=TA_LEFT,
+            spaceAfter=6,
+            leading=18
+        )
+        normal_style = ParagraphStyle(
+            'CustomNormal',
+            fontName=DEFAULT_FONT,
+            fontSize=12,
+            alignment=TA_LEFT,
+            leading=14
+        )
+        
+        elements.append(Paragraph("Отчет о состоянии системы", title_style))
+        elements.append(Spacer(1, 0.25*inch))
+        elements.append(Paragraph(f"Сгенерировано: {current_date}", normal_style))
+        elements.append(Spacer(1, 0.5*inch))
+        
+        elements.append(Paragraph("Основная информация", heading_style))  # Убрана лишняя скобка
+        
+        if system_data:
+            system_data_list = [
+                ["Параметр", "Значение"],
+                ["Пользователь", system_data.get('Пользователь', '—')],
+                ["IP-адрес", system_data.get('IP-адрес', '—')],
+                ["Порт SSH", system_data.get('Порт SSH', '—')],
+                ["Операционная система", system_data.get('Операционная система', '—')],
+                ["Версия ОС", system_data.get('Версия ОС', '—')],
+                ["Процессор", system_data.get('Процессор', '—')],
+                ["Оперативная память", system_data.get('Оперативная память', '—')],
+                ["Объем диска", system_data.get('Объем диска', '—')]
+            ]
+        else:
+            system_data_list = [
+                ["Параметр", "Значение"],
+                ["Пользователь", "—"],
+                ["IP-адрес", "—"],
+                ["Порт SSH", "—"],
+                ["Операционная система", "—"],
+                ["Версия ОС", "—"],
+                ["Процессор", "—"],
+                ["Оперативная память", "—"],
+                ["Объем диска", "—"]
+            ]
+        
+        t = Table(system_data_list, colWidths=[2.5*inch, 4*inch])
+        t.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), DEFAULT_FONT),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ]))
+        
+        elements.append(t)
+        elements.append(Spacer(1, 0.5*inch))
+        
+        elements.append(Paragraph("Использование ресурсов", heading_style))
+        elements.append(Spacer(1, 0.1*inch))
+        
+        with span('report.resource_charts'):
+            add_resource_charts(elements, system_data)
+
+        elements.append(Paragraph("Динамика нагрузки", heading_style))
+        elements.append(Spacer(1, 0.1*inch))
+
+        with span('report.trend_charts'):
+            add_trend_charts(elements, history)
+        
+        try:
+            with span('report.build'):
+                doc.build(elements)
+        except Exception as pdf_error:
+            logger.error(f"Ошибка при сохранении PDF-файла: {pdf_error}")
+            return None
+        
+        data = buf.getvalue()
+        logger.info(f"PDF-отчет успешно создан ({len(data)} байт).")
+        return data
+    except Exception as e:
+        logger.error(f"Ошибка при создании PDF: {e}", exc_info=True)
+        return None
+
+def render_report(system_data: dict, host_key, store_path: str = METRICS_STORAGE_PATH) -> Optional[bytes]:
+    """
+    Точка входа процесса рендеринга: выборка истории и создание PDF.
+
+    История читается из файлов хранилища внутри рабочего процесса,
+    поэтому между процессами передаются только данные отчета.
+    """
+    store = MetricsStore(store_path, writable=False)
+    try:
+        with span('report.history'):
+            history = collect_report_history(store, host_key) if host_key else {}
+    except Exception as e:
+        logger.error(f"Ошибка чтения истории метрик: {e}")
+        history = {}
+    finally:
+        store.close()
+    return generate_system_report_pdf(system_data, history)
@@ -0,0 +1,143 @@
+import asyncio
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from logger import logger, setup_worker_logging, start_worker_logging
+from telemetry import REPORT_RENDER_SECONDS
+from tracing import current_trace, span, trace
+
+# Число процессов рендеринга и предел заданий в очереди (включая выполняемые)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "1"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "8"))
+
+# Модуль report и reportlab импортируются только в рабочих процессах:
+# основной процесс бота их не загружает
+
+def _init_worker(log_queue):
+    """Инициализация рабочего процесса рендеринга."""
+    setup_worker_logging(log_queue)
+    from report import register_fonts
+    register_fonts()
+
+def _render(system_data: dict, host_key) -> Tuple[Optional[bytes], List[dict]]:
+    """Рендеринг отчета; вместе с PDF возвращаются этапы для трассировки запроса."""
+    from report import render_report
+    with trace('render', threshold=math.inf) as current:
+        pdf = render_report(system_data, host_key)
+    return pdf, current.spans
+
+def _prewarm() -> bool:
+    """Загрузка модулей отчета в рабочем процессе; True, если шрифты доступны."""
+    from report import register_fonts
+    import charts  # noqa: F401
+    return register_fonts()
+
+class ReportQueueFull(Exception):
+    """Очередь рендеринга отчетов переполнена."""
+
+class ReportRenderPool:
+    """
+    Рендеринг отчетов в пуле процессов с ограниченной очередью.
+
+    Одновременные запросы с одинаковым ключом объединяются в одно задание:
+    все вызывающие получают результат первого.
+    """
+    def __init__(self, workers: int = REPORT_WORKERS, max_pending: int = REPORT_QUEUE_SIZE):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._log_queue = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._inflight)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn не копирует потоки и сокеты бота в рабочие процессы
+            context = multiprocessing.get_context('spawn')
+            if self._log_queue is None:
+                self._log_queue = start_worker_logging(context)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._log_queue,)
+            )
+        return self._executor
+
+    async def _execute(self, func: Callable, *args: Any) -> Any:
+        """
+        Выполнение функции в пуле процессов.
+
+        Если рабочий процесс аварийно завершился (например, по OOM), пул
+        становится неработоспособным: он пересоздается и задание
+        повторяется один раз.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool as e:
+                logger.error(f"Пул рендеринга отчетов поврежден: {e}")
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+                if attempt:
+                    raise
+
+    async def prewarm(self) -> bool:
+        """
+        Запуск рабочих процессов заранее, чтобы первый /log не ждал
+        импорта reportlab и регистрации шрифтов.
+
+        Returns:
+            True, если шрифты отчета зарегистрированы
+        """
+        results = await asyncio.gather(*(self._execute(_prewarm) for _ in range(self.workers)))
+        return all(results)
+
+    async def submit(self, key: Hashable, collect: Callable[[], Awaitable[dict]], host_key=None) -> Optional[bytes]:
+        """
+        Сбор данных и рендеринг отчета.
+
+        Args:
+            key: Ключ объединения одинаковых запросов
+            collect: Корутина-фабрика, возвращающая данные отчета
+            host_key: Хост, историю которого нужно добавить в отчет
+
+        Raises:
+            ReportQueueFull: если очередь заполнена
+        """
+        job = self._inflight.get(key)
+        if job is None:
+            if len(self._inflight) >= self.max_pending:
+                raise ReportQueueFull()
+            job = asyncio.ensure_future(self._run(collect, host_key))
+            self._inflight[key] = job
+            job.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не прерывает общее задание
+        return await asyncio.shield(job)
+
+    async def _run(self, collect: Callable[[], Awaitable[dict]], host_key) -> Optional[bytes]:
+        with span('report.collect'):
+            system_data = await collect()
+        started = time.perf_counter()
+        with span('report.render'):
+            pdf, spans = await self._execute(_render, system_data, host_key)
+        REPORT_RENDER_SECONDS.observe(time.perf_counter() - started)
+        parent = current_trace()
+        if parent is not None:
+            parent.merge(spans, started)
+        return pdf
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,148 @@
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from logger import logger
+
+REPORT_STORAGE_PATH = os.getenv(
+    "REPORT_STORAGE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf-storage", "reports")
+)
+# Предельный суммарный объем сохраненных отчетов
+REPORT_STORE_MAX_BYTES = int(os.getenv("REPORT_STORE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+INDEX_FILE = "index.jsonl"
+
+class ReportEntry(NamedTuple):
+    report_id: str
+    user_id: int
+    host: str
+    timestamp: float
+    size: int
+
+    @property
+    def filename(self) -> str:
+        """Имя файла для отправки пользователю."""
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.timestamp))
+        host = re.sub(r'[^A-Za-z0-9._-]', '_', self.host)
+        return f"system_report_{host}_{stamp}.pdf"
+
+class ReportStore:
+    """
+    Хранилище готовых отчетов с индексом в памяти.
+
+    Индекс упорядочен по времени добавления, поэтому удаление самого
+    старого отчета при превышении ``max_bytes`` выполняется за O(1)
+    без просмотра каталога. Изменения индекса дописываются в журнал
+    ``index.jsonl``, который воспроизводится и сжимается при запуске.
+    """
+    def __init__(self, base_path: str = REPORT_STORAGE_PATH, max_bytes: int = REPORT_STORE_MAX_BYTES):
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries: "OrderedDict[str, ReportEntry]" = OrderedDict()
+        self.by_user: Dict[int, "OrderedDict[str, None]"] = {}
+        os.makedirs(base_path, exist_ok=True)
+        self._index_path = os.path.join(base_path, INDEX_FILE)
+        self._load_index()
+        self._journal = open(self._index_path, 'a', encoding='utf-8')
+
+    def _path(self, report_id: str) -> str:
+        return os.path.join(self.base_path, f"{report_id}.pdf")
+
+    def _load_index(self):
+        """Восстановление индекса из журнала и его сжатие."""
+        if not os.path.exists(self._index_path):
+            return
+        try:
+            with open(self._index_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # недописанная строка после аварийного завершения
+                    if record.get('op') == 'add':
+                        self._index_add(ReportEntry(*record['entry']))
+                    elif record.get('op') == 'del':
+                        self._index_remove(record['id'])
+        except OSError as e:
+            logger.error(f"Ошибка чтения индекса отчетов: {e}")
+            return
+
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps({'op': 'add', 'entry': list(entry)}) + "\n")
+        os.replace(tmp_path, self._index_path)
+
+    def _index_add(self, entry: ReportEntry):
+        self.entries[entry.report_id] = entry
+        self.by_user.setdefault(entry.user_id, OrderedDict())[entry.report_id] = None
+        self.total_bytes += entry.size
+
+    def _index_remove(self, report_id: str) -> Optional[ReportEntry]:
+        entry = self.entries.pop(report_id, None)
+        if entry is None:
+            return None
+        user_reports = self.by_user.get(entry.user_id)
+        if user_reports is not None:
+            user_reports.pop(report_id, None)
+            if not user_reports:
+                del self.by_user[entry.user_id]
+        self.total_bytes -= entry.size
+        return entry
+
+    def _log(self, record: dict):
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+
+    def add(self, user_id: int, host: str, data: bytes) -> ReportEntry:
+        """Сохранение отчета с вытеснением самых старых при переполнении."""
+        entry = ReportEntry(uuid.uuid4().hex[:12], user_id, host, time.time(), len(data))
+        with open(self._path(entry.report_id), 'wb') as f:
+            f.write(data)
+        self._index_add(entry)
+        self._log({'op': 'add', 'entry': list(entry)})
+
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            oldest_id = next(iter(self.entries))
+            self.remove(oldest_id)
+        return entry
+
+    def remove(self, report_id: str):
+        if self._index_remove(report_id) is None:
+            return
+        self._log({'op': 'del', 'id': report_id})
+        try:
+            os.remove(self._path(report_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Ошибка удаления отчета {report_id}: {e}")
+
+    def get(self, report_id: str) -> Optional[Tuple[ReportEntry, bytes]]:
+        entry = self.entries.get(report_id)
+        if entry is None:
+            return None
+        try:
+            with open(self._path(report_id), 'rb') as f:
+                return entry, f.read()
+        except OSError as e:
+            logger.error(f"Ошибка чтения отчета {report_id}: {e}")
+            self.remove(report_id)
+            return None
+
+    def recent(self, user_id: int, limit: int = 5) -> List[ReportEntry]:
+        """Последние отчеты пользователя, начиная с самого нового."""
+        result = []
+        for report_id in reversed(self.by_user.get(user_id, {})):
+            result.append(self.entries[report_id])
+            if len(result) >= limit:
+                break
+        return result
+
+    def close(self):
+        self._journal.close()
@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from logger import logger
+
+# Число одновременно выполняемых проверок во всем процессе
+MONITOR_WORKERS = int(os.getenv("MONITOR_WORKERS", "16"))
+# Случайное отклонение срока проверки (доля интервала), чтобы проверки
+# разных хостов не выстраивались в одну волну
+MONITOR_JITTER = float(os.getenv("MONITOR_JITTER", "0.1"))
+
+# Проверка возвращает интервал до следующего запуска или None для остановки
+CheckFunc = Callable[[Hashable], Awaitable[Optional[float]]]
+
+class MonitorScheduler:
+    """
+    Общий планировщик периодических проверок.
+
+    Сроки хранятся в куче (срок, номер, ключ), один диспетчер ждет ближайший
+    срок и передает наступившие задания в очередь, которую разбирают
+    ``workers`` обработчиков. Так число одновременных проверок ограничено
+    независимо от количества хостов. Интервал следующей проверки возвращает
+    сама проверка, к нему добавляется случайное отклонение ``jitter``.
+    """
+    def __init__(self, check: CheckFunc, workers: int = MONITOR_WORKERS,
+                 jitter: float = MONITOR_JITTER):
+        self.check = check
+        self.workers = max(1, workers)
+        self.jitter = jitter
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        # Номер актуальной записи в куче для каждого ключа; записи
+        # с другим номером устарели и пропускаются при извлечении
+        self._entries: Dict[Hashable, int] = {}
+        self._counter = itertools.count()
+        self._queue: "asyncio.Queue[Tuple[Hashable, int]]" = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _jittered(self, interval: float) -> float:
+        if self.jitter <= 0:
+            return interval
+        return max(0.0, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _push(self, key: Hashable, delay: float):
+        seq = next(self._counter)
+        self._entries[key] = seq
+        heapq.heappush(self._heap, (time.monotonic() + delay, seq, key))
+        self._wakeup.set()
+
+    def add(self, key: Hashable, interval: float, spread: bool = True):
+        """
+        Постановка ключа на периодическую проверку.
+
+        Args:
+            interval: Задержка первой проверки
+            spread: Выбрать первый срок случайно в пределах интервала,
+                чтобы одновременно добавленные хосты не совпадали по фазе
+        """
+        self._ensure_started()
+        delay = random.uniform(0, interval) if spread else self._jittered(interval)
+        self._push(key, delay)
+
+    def remove(self, key: Hashable) -> bool:
+        """Снятие ключа с проверки. Запись в куче удаляется лениво."""
+        return self._entries.pop(key, None) is not None
+
+    def _ensure_started(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._dispatch_loop()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker_loop()))
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self._heap)
+                if self._entries.get(key) == seq:
+                    self._queue.put_nowait((key, seq))
+
+            # Ожидание ближайшего срока или нового задания. Таймер вместо
+            # asyncio.wait_for: тот может потерять отмену задачи, если
+            # событие установлено одновременно с ней
+            timer = None
+            if self._heap:
+                timer = asyncio.get_running_loop().call_later(self._heap[0][0] - now, self._wakeup.set)
+            try:
+                await self._wakeup.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+    async def _worker_loop(self):
+        while True:
+            key, seq = await self._queue.get()
+            try:
+                if self._entries.get(key) != seq:
+                    continue  # ключ сняли с проверки, пока задание ждало в очереди
+                try:
+                    interval = await self.check(key)
+                except Exception as e:
+                    logger.error(f"Ошибка плановой проверки {key}: {e}")
+                    interval = None
+                # За время проверки ключ могли снять или добавить заново
+                if self._entries.get(key) != seq:
+                    continue
+                if interval is None:
+                    del self._entries[key]
+                else:
+                    self._push(key, self._jittered(interval))
+            finally:
+                self._queue.task_done()
+
+    async def shutdown(self):
+        """Остановка диспетчера и обработчиков."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._entries.clear()
+        self._heap.clear()
@@ -0,0 +1,325 @@
+import asyncio
+import functools
+import hashlib
+import itertools
+import os
+import re
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from logger import logger
+from collectors import BATCH_END, BATCH_MARKER
+from telemetry import SSH_CONNECT_SECONDS, SSH_ERRORS, SSH_EXEC_SECONDS, SSH_POOL_REQUESTS, host_label
+from tracing import span
+
+if TYPE_CHECKING:
+    import paramiko  # type: ignore
+
+# Размер пула потоков для блокирующих вызовов paramiko. Ограничивает
+# число одновременных SSH-операций во всем процессе.
+SSH_MAX_WORKERS = int(os.getenv("SSH_MAX_WORKERS", "32"))
+
+# Интервал SSH keepalive в секундах: мертвое соединение обнаруживается
+# транспортом paramiko без запуска процессов на удаленном хосте
+SSH_KEEPALIVE_INTERVAL = int(os.getenv("SSH_KEEPALIVE_INTERVAL", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=SSH_MAX_WORKERS, thread_name_prefix="ssh")
+
+# Клиенты, на которых последняя команда завершилась ошибкой
+_failed_clients: "weakref.WeakSet[paramiko.SSHClient]" = weakref.WeakSet()
+
+# Порядковые номера сессий: новое подключение получает новый номер
+_session_ids = itertools.count(1)
+
+# Метка хоста ("адрес:порт") для метрик команд, выполняемых на клиенте
+_client_hosts: "weakref.WeakKeyDictionary[paramiko.SSHClient, str]" = weakref.WeakKeyDictionary()
+
+_BATCH_KEY = re.compile(re.escape(BATCH_MARKER) + r"(\w+)")
+
+def command_label(command: str) -> str:
+    """Короткое название команды для трассировки: ключи пакетного скрипта или начало строки."""
+    if BATCH_MARKER in command:
+        end = BATCH_END[len(BATCH_MARKER):]
+        return "batch:" + ",".join(key for key in _BATCH_KEY.findall(command) if key != end)
+    return command if len(command) <= 40 else command[:37] + "..."
+
+async def run_blocking(func, *args, **kwargs):
+    """Выполнение блокирующей функции в пуле SSH-потоков."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def preload():
+    """Импорт paramiko; вызывается в фоне, чтобы не задерживать запуск бота."""
+    import paramiko  # type: ignore  # noqa: F401
+
+def _connect(hostname: str, port: int, username: str, password: str, timeout: float) -> "paramiko.SSHClient":
+    import paramiko  # type: ignore
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    try:
+        client.connect(
+            hostname=hostname,
+            port=port,
+            username=username,
+            password=password,
+            timeout=timeout,
+            banner_timeout=timeout,
+            auth_timeout=timeout
+        )
+    except Exception:
+        client.close()
+        raise
+    transport = client.get_transport()
+    if transport is not None and SSH_KEEPALIVE_INTERVAL > 0:
+        transport.set_keepalive(SSH_KEEPALIVE_INTERVAL)
+    return client
+
+def _exec(client: "paramiko.SSHClient", command: str, timeout: float) -> Tuple[str, str]:
+    _, stdout, stderr = client.exec_command(command, timeout=timeout)
+    output = stdout.read().decode(errors='replace')
+    error = stderr.read().decode(errors='replace')
+    return output, error
+
+async def connect(hostname: str, username: str, password: str,
+                  port: int = 22, timeout: float = 10) -> "paramiko.SSHClient":
+    """Асинхронное подключение по SSH без блокировки event loop."""
+    host = host_label(hostname, port)
+    started = time.perf_counter()
+    try:
+        with span('ssh.connect', host=host):
+            client = await run_blocking(_connect, hostname, port, username, password, timeout)
+    except Exception:
+        SSH_ERRORS.inc(host, 'connect')
+        raise
+    SSH_CONNECT_SECONDS.observe(time.perf_counter() - started, host)
+    _client_hosts[client] = host
+    return client
+
+async def exec_command(client: "paramiko.SSHClient", command: str, timeout: float = 10) -> Tuple[str, str]:
+    """
+    Асинхронное выполнение команды.
+
+    Returns:
+        Кортеж (stdout, stderr)
+    """
+    started = time.perf_counter()
+    try:
+        with span('ssh.exec', cmd=command_label(command)):
+            result = await run_blocking(_exec, client, command, timeout)
+    except Exception:
+        _failed_clients.add(client)
+        SSH_ERRORS.inc(_client_hosts.get(client, ''), 'exec')
+        raise
+    _failed_clients.discard(client)
+    SSH_EXEC_SECONDS.observe(time.perf_counter() - started, _client_hosts.get(client, ''))
+    return result
+
+def is_auth_error(error: BaseException) -> bool:
+    """
+    Отклонил ли сервер учетные данные при подключении.
+
+    BadAuthenticationType (вход по паролю на хосте выключен) сюда не
+    относится: это состояние хоста, а не данных пользователя.
+    """
+    import paramiko  # type: ignore
+    return (isinstance(error, paramiko.AuthenticationException)
+            and not isinstance(error, paramiko.BadAuthenticationType))
+
+def is_transport_active(client: "paramiko.SSHClient") -> bool:
+    """Проверка состояния транспорта без обращения к удаленному хосту."""
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+def had_failure(client: "paramiko.SSHClient") -> bool:
+    """Завершилась ли последняя команда на клиенте ошибкой."""
+    return client in _failed_clients
+
+def host_fingerprint(client: "paramiko.SSHClient") -> str:
+    """Отпечаток ключа удаленного хоста или пустая строка."""
+    transport = client.get_transport()
+    if transport is None:
+        return ''
+    try:
+        return transport.get_remote_server_key().get_fingerprint().hex()
+    except Exception:
+        return ''
+
+async def close(client: "paramiko.SSHClient"):
+    """Закрытие соединения в фоновом потоке."""
+    try:
+        await run_blocking(client.close)
+    except Exception as e:
+        logger.error(f"Ошибка закрытия SSH соединения: {e}")
+
+class PooledConnection:
+    """SSH-сессия в общем пуле со счетчиком активных пользователей."""
+    def __init__(self, key: tuple, client: "paramiko.SSHClient"):
+        self.key = key
+        self.client = client
+        self.refs = 0
+        self.last_used = time.time()
+        self.os_type: Optional[str] = None  # определяется один раз на сессию
+        self.retired = False  # исключена из пула, закрывается после освобождения
+        self.session_id = next(_session_ids)
+        self.fingerprint = host_fingerprint(client)
+
+    @property
+    def host_key(self) -> Tuple[str, int]:
+        """Идентификатор хоста (адрес, порт) для данных уровня хоста."""
+        return self.key[0], self.key[1]
+
+    @property
+    def cache_token(self) -> Tuple[int, str]:
+        """Токен для кэшированных данных: меняется при переподключении и смене ключа хоста."""
+        return self.session_id, self.fingerprint
+
+class SSHPool:
+    """
+    Общий для процесса пул SSH-сессий.
+
+    Сессии идентифицируются тройкой (host, port, user) и отпечатком пароля,
+    поэтому одну сессию делят только вызовы с одинаковыми учетными данными.
+    Используемые сессии защищены счетчиком ссылок, простаивающие дольше
+    ``timeout`` секунд закрываются.
+    """
+    def __init__(self, timeout: int = 600):
+        self.connections: Dict[tuple, PooledConnection] = {}
+        self.timeout = timeout
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def make_key(ssh_data: dict) -> tuple:
+        digest = hashlib.sha256(ssh_data['password'].encode()).hexdigest()[:16]
+        return ssh_data['hostname'], ssh_data.get('port', 22), ssh_data['username'], digest
+
+    async def acquire(self, ssh_data: dict) -> Tuple[PooledConnection, bool]:
+        """
+        Получение сессии из пула или создание новой.
+
+        Returns:
+            Кортеж (сессия, признак нового подключения)
+        """
+        self._ensure_reaper()
+        with span('ssh.acquire'):
+            return await self._acquire(ssh_data)
+
+    async def _acquire(self, ssh_data: dict) -> Tuple[PooledConnection, bool]:
+        key = self.make_key(ssh_data)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        # Блокировка не дает двум вызовам одновременно подключаться к одному хосту
+        async with lock:
+            conn = self.connections.get(key)
+            if conn is not None:
+                if await self._is_alive(conn):
+                    conn.refs += 1
+                    conn.last_used = time.time()
+                    SSH_POOL_REQUESTS.inc('hit')
+                    return conn, False
+                SSH_POOL_REQUESTS.inc('stale')
+                await self._discard(conn)
+            else:
+                SSH_POOL_REQUESTS.inc('miss')
+
+            client = await connect(
+                hostname=ssh_data['hostname'],
+                username=ssh_data['username'],
+                password=ssh_data['password'],
+                port=ssh_data.get('port', 22),
+                timeout=10
+            )
+            conn = PooledConnection(key, client)
+            conn.refs = 1
+            self.connections[key] = conn
+            return conn, True
+
+    async def release(self, conn: PooledConnection, broken: bool = False):
+        """Возврат сессии в пул. Сломанная сессия закрывается."""
+        conn.refs = max(0, conn.refs - 1)
+        conn.last_used = time.time()
+        if broken or conn.retired:
+            await self._discard(conn)
+
+    @asynccontextmanager
+    async def lease(self, ssh_data: dict):
+        """Контекстный менеджер для временного использования сессии."""
+        conn, _ = await self.acquire(ssh_data)
+        # Модуль уже загружен при подключении в acquire
+        import paramiko  # type: ignore
+        broken = False
+        try:
+            yield conn
+        except (paramiko.SSHException, OSError, EOFError):
+            broken = True
+            raise
+        finally:
+            await self.release(conn, broken)
+
+    async def _is_alive(self, conn: PooledConnection) -> bool:
+        """
+        Проверка сессии перед выдачей.
+
+        Обычно достаточно состояния транспорта, которое поддерживается
+        keepalive-пакетами. Команда-проба выполняется только если
+        предыдущая команда на этой сессии завершилась ошибкой.
+        """
+        if not is_transport_active(conn.client):
+            return False
+        if not had_failure(conn.client):
+            return True
+        try:
+            output, _ = await exec_command(conn.client, 'echo 1', timeout=2)
+            return output.strip() == '1'
+        except Exception:
+            return False
+
+    async def _discard(self, conn: PooledConnection):
+        """Удаление сессии из пула; закрытие откладывается до освобождения."""
+        if self.connections.get(conn.key) is conn:
+            del self.connections[conn.key]
+        conn.retired = True
+        if conn.refs == 0:
+            await close(conn.client)
+
+    async def cleanup(self):
+        """Закрытие сессий, простаивающих дольше таймаута."""
+        current_time = time.time()
+        for conn in list(self.connections.values()):
+            # Пока закрывалась предыдущая сессия, _acquire мог удалить
+            # или заменить эту: тогда она уже не принадлежит пулу
+            if self.connections.get(conn.key) is not conn:
+                continue
+            if conn.refs == 0 and current_time - conn.last_used > self.timeout:
+                lock = self._locks.get(conn.key)
+                if lock is not None and not lock.locked():
+                    del self._locks[conn.key]
+                await self._discard(conn)
+
+    async def close_all(self):
+        """Закрытие всех сессий при остановке бота."""
+        for conn in list(self.connections.values()):
+            if self.connections.get(conn.key) is not conn:
+                continue
+            del self.connections[conn.key]
+            await close(conn.client)
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.timeout / 2)
+            try:
+                await self.cleanup()
+            except Exception as e:
+                logger.error(f"Ошибка очистки пула SSH: {e}")
+
+# Общий пул сессий для отчетов и мониторинга
+ssh_pool = SSHPool()
@@ -0,0 +1,36 @@
+import os
+import time
+from typing import Dict
+import psutil  # type: ignore
+from aiogram import types  # type: ignore
+from aiogram.dispatcher.middlewares import BaseMiddleware  # type: ignore
+from logger import logger
+
+# Время запуска процесса, включая старт интерпретатора
+PROCESS_START = psutil.Process(os.getpid()).create_time()
+
+class StartupTimer:
+    """Отметки времени запуска бота относительно старта процесса."""
+    def __init__(self):
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str) -> float:
+        """Запись и вывод в лог времени этапа запуска в секундах."""
+        elapsed = time.time() - PROCESS_START
+        self.marks[name] = elapsed
+        logger.info(f"Запуск: {name} через {elapsed:.3f} с")
+        return elapsed
+
+startup_timer = StartupTimer()
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Замер времени до первого обработанного обновления Telegram."""
+    def __init__(self, timer: StartupTimer = startup_timer):
+        super().__init__()
+        self.timer = timer
+        self.done = False
+
+    async def on_post_process_update(self, update: types.Update, result, data: dict):
+        if not self.done:
+            self.done = True
+            self.timer.mark("первое обновление обработано")
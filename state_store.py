@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+from cryptography.fernet import Fernet, InvalidToken  # type: ignore
+from logger import logger
+
+STATE_DB_PATH = os.getenv(
+    "STATE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf-storage", "state.db")
+)
+# Ключ Fernet для шифрования учетных данных. Если не задан, ключ
+# создается при первом запуске и хранится в STATE_KEY_PATH (по умолчанию
+# рядом с базой). Ключ, лежащий вместе с базой, не защищает ее копию или
+# резервную копию каталога данных, поэтому в Docker он хранится отдельно
+STATE_ENCRYPTION_KEY = os.getenv("STATE_ENCRYPTION_KEY")
+STATE_KEY_PATH = os.getenv("STATE_KEY_PATH")
+# Как часто (в секундах) накопленные изменения записываются в базу
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "1"))
+
+# Таблицы состояния: user_id -> значение
+CREDENTIALS = 'credentials'
+MONITORS = 'monitors'
+USER_STATES = 'user_states'
+LOCKOUTS = 'lockouts'
+ALERTS = 'alerts'
+
+TABLES = (CREDENTIALS, MONITORS, USER_STATES, LOCKOUTS, ALERTS)
+ENCRYPTED_TABLES = {CREDENTIALS, MONITORS}
+
+def _load_key(db_path: str) -> bytes:
+    if STATE_ENCRYPTION_KEY:
+        return STATE_ENCRYPTION_KEY.encode()
+    key_path = STATE_KEY_PATH or os.path.splitext(db_path)[0] + ".key"
+    try:
+        with open(key_path, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    key = Fernet.generate_key()
+    os.makedirs(os.path.dirname(key_path) or '.', exist_ok=True)
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    logger.warning(f"STATE_ENCRYPTION_KEY не задан, создан ключ {key_path}")
+    return key
+
+class StateStore:
+    """
+    Состояние бота в SQLite: учетные данные, мониторинг, блокировки и алерты.
+
+    Изменения копятся в памяти (последнее значение по ключу) и записываются
+    одной транзакцией раз в ``flush_interval`` секунд в фоновом потоке.
+    Учетные данные шифруются Fernet.
+    """
+    def __init__(self, path: str = STATE_DB_PATH, key: Optional[bytes] = None,
+                 flush_interval: float = STATE_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._fernet = Fernet(key or _load_key(path))
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for table in TABLES:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL)"
+            )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, int], Optional[bytes]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _encode(self, table: str, value: Any) -> bytes:
+        data = json.dumps(value).encode()
+        return self._fernet.encrypt(data) if table in ENCRYPTED_TABLES else data
+
+    def _decode(self, table: str, data: bytes) -> Any:
+        if table in ENCRYPTED_TABLES:
+            data = self._fernet.decrypt(data)
+        return json.loads(data)
+
+    def load(self, table: str) -> Dict[int, Any]:
+        """Все записи таблицы. Нерасшифровываемые записи пропускаются."""
+        result = {}
+        with self._lock:
+            rows = self._db.execute(f"SELECT user_id, data FROM {table}").fetchall()
+        for user_id, data in rows:
+            try:
+                result[user_id] = self._decode(table, data)
+            except (InvalidToken, ValueError) as e:
+                logger.error(f"Не удалось прочитать запись {table}/{user_id}: {e!r}")
+        return result
+
+    def save(self, table: str, user_id: int, value: Any):
+        """Постановка записи в очередь; None удаляет запись."""
+        self._pending[(table, user_id)] = None if value is None else self._encode(table, value)
+
+    def _write(self, batch: Dict[Tuple[str, int], Optional[bytes]]):
+        with self._lock, self._db:
+            for (table, user_id), data in batch.items():
+                if data is None:
+                    self._db.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+                else:
+                    self._db.execute(
+                        f"INSERT OR REPLACE INTO {table} (user_id, data) VALUES (?, ?)",
+                        (user_id, data)
+                    )
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи состояния: {e}")
+            # Возвращаем несохраненное, не затирая более новые изменения
+            for key, data in batch.items():
+                self._pending.setdefault(key, data)
+
+    def start(self):
+        """Запуск фоновой записи изменений."""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        with self._lock:
+            self._db.close()
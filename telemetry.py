@@ -0,0 +1,198 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from logger import logger
+
+# Порт HTTP-эндпоинта /metrics; если не задан, эндпоинт не запускается
+# и замеры не собираются
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Период проверки задержки event loop, с
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric(ABC):
+    type_name = ''
+
+    def __init__(self, registry: "Registry", name: str, help_text: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        registry.register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+    @abstractmethod
+    def collect(self) -> List[str]:
+        """Строки значений метрики в формате Prometheus."""
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        if self.registry.enabled:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+                for labels, value in self.values.items()]
+
+class Gauge(Metric):
+    """Значение, вычисляемое функцией в момент опроса."""
+    type_name = 'gauge'
+
+    def __init__(self, *args, func: Callable[[], float], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.func = func
+
+    def collect(self) -> List[str]:
+        try:
+            return [f"{self.name} {_format_value(self.func())}"]
+        except Exception as e:
+            logger.error(f"Ошибка вычисления метрики {self.name}: {e}")
+            return []
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # На набор меток: счетчики по корзинам (не накопительные), сумма, количество
+        self.series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not self.registry.enabled:
+            return
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = ([0] * (len(self.buckets) + 1), [0.0, 0.0])
+        counts, totals = series
+        counts[bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    def collect(self) -> List[str]:
+        lines = []
+        for labels, (counts, (total, count)) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {int(count)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {int(count)}")
+        return lines
+
+class Registry:
+    """
+    Набор метрик в формате Prometheus.
+
+    Пока эндпоинт не запущен (``enabled`` ложно), обновление метрик сводится
+    к одной проверке флага.
+    """
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.enabled = False
+
+    def register(self, metric: Metric):
+        self.metrics.append(metric)
+
+    def exposition(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+SSH_CONNECT_SECONDS = Histogram(REGISTRY, 'ssb_ssh_connect_seconds',
+                                'Длительность SSH-подключения', ['host'])
+SSH_EXEC_SECONDS = Histogram(REGISTRY, 'ssb_ssh_exec_seconds',
+                             'Длительность выполнения SSH-команды', ['host'])
+SSH_ERRORS = Counter(REGISTRY, 'ssb_ssh_errors_total', 'Ошибки SSH', ['host', 'stage'])
+SSH_POOL_REQUESTS = Counter(REGISTRY, 'ssb_ssh_pool_requests_total',
+                            'Запросы сессий из пула SSH', ['result'])
+METRICS_CACHE_REQUESTS = Counter(REGISTRY, 'ssb_metrics_cache_requests_total',
+                                 'Обращения к кэшу метрик мониторинга', ['result'])
+REPORT_RENDER_SECONDS = Histogram(REGISTRY, 'ssb_report_render_seconds', 'Длительность рендеринга PDF')
+TELEGRAM_REQUEST_SECONDS = Histogram(REGISTRY, 'ssb_telegram_request_seconds',
+                                     'Длительность запросов к Telegram Bot API', ['method'])
+TELEGRAM_ERRORS = Counter(REGISTRY, 'ssb_telegram_errors_total',
+                          'Ошибки запросов к Telegram Bot API', ['method'])
+LOOP_LAG_SECONDS = Histogram(REGISTRY, 'ssb_event_loop_lag_seconds', 'Задержка event loop',
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+def gauge(name: str, help_text: str, func: Callable[[], float]) -> Gauge:
+    """Регистрация метрики, вычисляемой в момент опроса."""
+    return Gauge(REGISTRY, name, help_text, func=func)
+
+async def _loop_lag_monitor(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - interval))
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics на aiohttp и фоновый замер задержки event loop."""
+    def __init__(self, host: str = METRICS_HOST, port: Optional[int] = None):
+        self.host = host
+        self.port = port if port is not None else int(METRICS_PORT or 0)
+        self._runner = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        from aiohttp import web  # type: ignore
+
+        async def handle(request):
+            return web.Response(text=REGISTRY.exposition(), content_type='text/plain',
+                                charset='utf-8', headers={'X-Content-Type-Options': 'nosniff'})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        REGISTRY.enabled = True
+        self._lag_task = asyncio.create_task(_loop_lag_monitor(LOOP_LAG_INTERVAL))
+        logger.info(f"Эндпоинт метрик: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        REGISTRY.enabled = False
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def host_label(hostname: str, port: int) -> str:
+    return f"{hostname}:{port}"
@@ -0,0 +1,170 @@
+import os
+from array import array
+from typing import Dict, Hashable, List, NamedTuple, Optional
+
+# Емкость буфера по умолчанию: сутки при проверке раз в минуту
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", "1440"))
+
+RESOURCES = ('cpu', 'ram', 'disk')
+
+class Sample(NamedTuple):
+    timestamp: float
+    cpu: float
+    ram: float
+    disk: float
+
+class SampleRing:
+    """
+    Кольцевой буфер замеров cpu/ram/disk фиксированного размера.
+
+    Данные хранятся в массивах ``array``: метка времени как double (8 байт)
+    и значения как float (по 4 байта), то есть 20 байт на замер.
+    Метки времени должны добавляться в порядке возрастания.
+    """
+    ITEM_SIZE = 8 + 4 * len(RESOURCES)
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity должен быть положительным")
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = {resource: array('f', bytes(4 * capacity)) for resource in RESOURCES}
+        self._head = 0  # индекс следующей записи
+        self._size = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        """Объем памяти под данные буфера."""
+        return self.capacity * self.ITEM_SIZE
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, cpu: float, ram: float, disk: float):
+        idx = self._head
+        self.timestamps[idx] = timestamp
+        self.values['cpu'][idx] = cpu
+        self.values['ram'][idx] = ram
+        self.values['disk'][idx] = disk
+        self._head = (idx + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def _physical(self, logical: int) -> int:
+        """Перевод порядкового номера (0 - самый старый) в индекс массива."""
+        return (self._head - self._size + logical) % self.capacity
+
+    def _sample(self, logical: int) -> Sample:
+        idx = self._physical(logical)
+        return Sample(
+            self.timestamps[idx],
+            self.values['cpu'][idx],
+            self.values['ram'][idx],
+            self.values['disk'][idx]
+        )
+
+    def _lower_bound(self, timestamp: float) -> int:
+        """Номер первого замера с меткой времени не меньше заданной."""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[self._physical(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def latest(self, n: int = 1) -> List[Sample]:
+        """Последние n замеров в хронологическом порядке."""
+        n = max(0, min(n, self._size))
+        return [self._sample(i) for i in range(self._size - n, self._size)]
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Sample]:
+        """Замеры с меткой времени в интервале [start, end]."""
+        first = 0 if start is None else self._lower_bound(start)
+        last = self._size if end is None else self._lower_bound(end)
+        # Включаем замеры с меткой ровно end
+        while last < self._size and self.timestamps[self._physical(last)] == end:
+            last += 1
+        return [self._sample(i) for i in range(first, last)]
+
+    def stats(self, start: Optional[float] = None,
+              end: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Минимум, максимум и среднее по каждому ресурсу за интервал.
+
+        Returns:
+            ``{'cpu': {'min': .., 'max': .., 'avg': ..}, ...}`` или пустой
+            словарь, если за интервал нет замеров
+        """
+        samples = self.range(start, end)
+        if not samples:
+            return {}
+        result = {}
+        for resource in RESOURCES:
+            values = [getattr(sample, resource) for sample in samples]
+            result[resource] = {
+                'min': min(values),
+                'max': max(values),
+                'avg': sum(values) / len(values)
+            }
+        return result
+
+class MetricsHistory:
+    """История замеров по хостам, по одному кольцевому буферу на хост."""
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.rings: Dict[Hashable, SampleRing] = {}
+
+    def record(self, host_key: Hashable, timestamp: float, metrics: Dict[str, float]):
+        ring = self.rings.get(host_key)
+        if ring is None:
+            ring = self.rings[host_key] = SampleRing(self.capacity)
+        ring.append(
+            timestamp,
+            metrics.get('cpu', 0.0),
+            metrics.get('ram', 0.0),
+            metrics.get('disk', 0.0)
+        )
+
+    def get(self, host_key: Hashable) -> Optional[SampleRing]:
+        return self.rings.get(host_key)
+
+    def drop(self, host_key: Hashable):
+        self.rings.pop(host_key, None)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(ring.memory_bytes for ring in self.rings.values())
+
+def minmax_downsample(timestamps, values, max_points: int):
+    """
+    Прореживание ряда с сохранением пиков (min/max по корзинам).
+
+    Ряд делится на корзины равной длины, из каждой берутся точки минимума
+    и максимума в хронологическом порядке. Все операции векторные (numpy),
+    поэтому неделя минутных замеров обрабатывается за миллисекунды.
+
+    Returns:
+        Кортеж массивов (timestamps, values) длиной не более max_points
+    """
+    import numpy as np  # type: ignore
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= max_points or max_points < 2:
+        return timestamps, values
+
+    bucket_size = -(-n // (max_points // 2))  # деление с округлением вверх
+    buckets = -(-n // bucket_size)
+    padded = np.full(buckets * bucket_size, np.nan)
+    padded[:n] = values
+    grid = padded.reshape(buckets, bucket_size)
+
+    offsets = np.arange(buckets) * bucket_size
+    idx_min = np.nanargmin(grid, axis=1) + offsets
+    idx_max = np.nanargmax(grid, axis=1) + offsets
+    # np.unique сортирует индексы и убирает совпадения min == max
+    indices = np.unique(np.concatenate([idx_min, idx_max]))
+    return timestamps[indices], values[indices]
@@ -0,0 +1,105 @@
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from logger import logger
+
+# Запросы дольше порога (в секундах) записываются в лог с разбивкой по этапам
+TRACE_SLOW_THRESHOLD = float(os.getenv("TRACE_SLOW_THRESHOLD", "5"))
+
+class Trace:
+    """
+    Трассировка одного запроса: идентификатор и длительности этапов.
+
+    Этапы хранятся плоским списком со смещением от начала запроса,
+    вложенность видна по пересечению интервалов.
+    """
+    def __init__(self, name: str, **attrs: Any):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.error = False
+
+    def add_span(self, name: str, started: float, duration: float,
+                 error: bool = False, **attrs: Any):
+        record = {
+            'name': name,
+            'start_ms': round((started - self.started) * 1000, 1),
+            'duration_ms': round(duration * 1000, 1)
+        }
+        if error:
+            record['error'] = True
+        record.update(attrs)
+        self.spans.append(record)
+
+    def merge(self, spans: List[Dict[str, Any]], started: float):
+        """Добавление этапов, записанных в другом процессе, начиная с момента ``started``."""
+        offset = round((started - self.started) * 1000, 1)
+        for record in spans:
+            self.spans.append(dict(record, start_ms=round(record['start_ms'] + offset, 1)))
+
+    def to_dict(self, total: float) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            **self.attrs,
+            'total_ms': round(total * 1000, 1),
+            'error': self.error,
+            'spans': sorted(self.spans, key=lambda record: record['start_ms'])
+        }
+
+_current: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+def current_trace_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.trace_id if trace is not None else None
+
+@contextmanager
+def trace(name: str, threshold: Optional[float] = None, **attrs: Any) -> Iterator[Trace]:
+    """
+    Трассировка запроса. Задачи, созданные внутри блока, наследуют ее
+    через contextvars.
+
+    Args:
+        threshold: Порог записи в лог, по умолчанию TRACE_SLOW_THRESHOLD
+    """
+    current = Trace(name, **attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException:
+        current.error = True
+        raise
+    finally:
+        _current.reset(token)
+        total = time.perf_counter() - current.started
+        limit = TRACE_SLOW_THRESHOLD if threshold is None else threshold
+        if total >= limit:
+            logger.warning(
+                f"Медленный запрос {name}: {total * 1000:.0f} мс",
+                extra={'trace': current.to_dict(total), 'trace_id': current.trace_id}
+            )
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Замер этапа текущего запроса; вне трассировки ничего не делает."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        current.add_span(name, started, time.perf_counter() - started, error, **attrs)